@@ -5,7 +5,9 @@ from sqlalchemy import pool
 
 from alembic import context
 
-from models import Base, Category, FoodItem, Restaurant, SubCategory, FoodItemSubcategory
+from models import Base, Category, FoodItem, Restaurant, SubCategory, FoodItemSubcategory, LoadManifest, \
+    RestaurantNutritionStats
+from session import get_database_url
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -16,6 +18,9 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Use the same DB URL as the application (DATABASE_URL takes precedence over alembic.ini)
+config.set_main_option('sqlalchemy.url', get_database_url().replace('%', '%%'))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
@@ -0,0 +1,39 @@
+"""Restaurant nutrition stats
+
+Revision ID: 3d9c51e0a7f4
+Revises: ca42f8d70bba
+Create Date: 2026-10-18 12:31:44.083152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9c51e0a7f4'
+down_revision = 'ca42f8d70bba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('restaurant_nutrition_stats',
+    sa.Column('restaurant_id', sa.Integer(), nullable=False),
+    sa.Column('items', sa.Integer(), nullable=False),
+    sa.Column('avg_calories', sa.Float(), nullable=True),
+    sa.Column('min_calories', sa.Integer(), nullable=True),
+    sa.Column('max_calories', sa.Integer(), nullable=True),
+    sa.Column('avg_carbs', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['restaurant_id'], ['restaurants.id'], ),
+    sa.PrimaryKeyConstraint('restaurant_id')
+    )
+
+    # Compute the statistics of the items already in DB, the loader keeps them up to date afterwards
+    op.execute('INSERT INTO restaurant_nutrition_stats '
+               '(restaurant_id, items, avg_calories, min_calories, max_calories, avg_carbs) '
+               'SELECT restaurant_id, count(id), avg(calories), min(calories), max(calories), avg(total_carb) '
+               'FROM food_items GROUP BY restaurant_id')
+
+
+def downgrade() -> None:
+    op.drop_table('restaurant_nutrition_stats')
@@ -0,0 +1,46 @@
+"""Indexes for hot query paths
+
+Revision ID: 7be1513eedba
+Revises: f7af2a902a3d
+Create Date: 2026-10-18 11:02:17.904513
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7be1513eedba'
+down_revision = 'f7af2a902a3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Entities are looked up by name when loading
+    for table in ('restaurants', 'categories', 'sub_categories'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(f'uq_{table}_name', ['name'])
+
+    # food_items.restaurant_id is covered by uq_food_items_restaurant_id_name
+    op.create_index('ix_food_items_category_id', 'food_items', ['category_id'])
+    op.create_index('ix_food_items_name', 'food_items', ['name'])
+
+    # food_item_subcategory.food_item_id is covered by the leading column of the constraint
+    with op.batch_alter_table('food_item_subcategory') as batch_op:
+        batch_op.create_unique_constraint('uq_food_item_subcategory_food_item_id_subcategory_id',
+                                          ['food_item_id', 'subcategory_id'])
+    op.create_index('ix_food_item_subcategory_subcategory_id', 'food_item_subcategory', ['subcategory_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_food_item_subcategory_subcategory_id', table_name='food_item_subcategory')
+    with op.batch_alter_table('food_item_subcategory') as batch_op:
+        batch_op.drop_constraint('uq_food_item_subcategory_food_item_id_subcategory_id', type_='unique')
+
+    op.drop_index('ix_food_items_name', table_name='food_items')
+    op.drop_index('ix_food_items_category_id', table_name='food_items')
+
+    for table in ('restaurants', 'categories', 'sub_categories'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'uq_{table}_name', type_='unique')
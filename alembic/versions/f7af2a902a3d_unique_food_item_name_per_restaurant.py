@@ -0,0 +1,32 @@
+"""Unique food item name per restaurant
+
+Revision ID: f7af2a902a3d
+Revises: 12e9bafcb8b2
+Create Date: 2026-10-18 10:12:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7af2a902a3d'
+down_revision = '12e9bafcb8b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Remove duplicated items (same restaurant and name) keeping the oldest one, they would violate the constraint
+    duplicates = ('SELECT f.id FROM food_items f JOIN food_items d '
+                  'ON d.restaurant_id = f.restaurant_id AND d.name = f.name AND d.id < f.id')
+    op.execute(f'DELETE FROM food_item_subcategory WHERE food_item_id IN ({duplicates})')
+    op.execute(f'DELETE FROM food_items WHERE id IN ({duplicates})')
+
+    with op.batch_alter_table('food_items') as batch_op:
+        batch_op.create_unique_constraint('uq_food_items_restaurant_id_name', ['restaurant_id', 'name'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('food_items') as batch_op:
+        batch_op.drop_constraint('uq_food_items_restaurant_id_name', type_='unique')
@@ -0,0 +1,211 @@
+import asyncio
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from data_loader import (DataParser, EntityHandler, RestaurantMenuHandler, categories_list, _create_categorizer,
+                         _create_parser, _create_writer, _match_cache_stats, _record)
+from deduplication import ExistingItems
+from item_writer import ItemRecord
+from load_options import DEFAULT_BATCH_SIZE, DEFAULT_QUEUE_SIZE, csv_engines, csv_readers, dedup_modes
+from metrics import metrics
+from nutrition_stats import refresh_nutrition_stats
+from session import create_async_engine_from_config
+
+# Load modes and deduplication modes of the pipeline: the copy mode merges everything in one transaction
+# and the per-restaurant queries of the 'query' mode would race with the writes of earlier chunks
+async_load_modes = ('bulk', 'row')
+async_dedup_modes = ('preload', 'db')
+
+
+class StageQueue(asyncio.Queue):
+    '''
+    Bounded queue between two stages of the pipeline: a full queue suspends the producing stage
+    (backpressure). Records the depth after every put and the time producers waited for a free slot
+    '''
+    def __init__(self, name: str, maxsize: int) -> None:
+        super().__init__(maxsize)
+        self.name = name
+        self.puts = 0
+        self.total_depth = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+
+    async def put(self, item: Any) -> None:
+        start_time = time.perf_counter()
+        await super().put(item)
+        if item is None:
+            # End of the stage
+            return
+        self.blocked_seconds += time.perf_counter() - start_time
+        depth = self.qsize()
+        self.puts += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'capacity': self.maxsize, 'puts': self.puts, 'max_depth': self.max_depth,
+                'mean_depth': round(self.total_depth / self.puts, 2) if self.puts else 0.0,
+                'blocked_seconds': round(self.blocked_seconds, 6)}
+
+
+def _next_chunk(chunks: Iterator[DataParser]) -> DataParser | None:
+    # Read the next chunk and index it by restaurant (a single chunk is only read when indexed)
+    chunk = next(chunks, None)
+    if chunk is not None:
+        chunk.get_restaurants_names()
+    return chunk
+
+
+def _build_records(chunk: DataParser, restaurant_name: str, categorizer, restaurant_id: int,
+                   category_ids: Dict[str, int], subcategory_ids: Dict[str, int],
+                   existing_items: ExistingItems | None) -> Tuple[RestaurantMenuHandler, List[ItemRecord]]:
+    # The rows of the restaurant are parsed here with MappedDataParser
+    restaurant_menu = RestaurantMenuHandler(restaurant_name, chunk.get_restaurant_data(restaurant_name), categorizer)
+    items = restaurant_menu.get_unique_items()
+    if existing_items is not None:
+        # Items of earlier chunks may still be waiting to be written, the writer filters the records again
+        items = existing_items.filter_new(restaurant_id, items)
+    return restaurant_menu, restaurant_menu.build_item_records(items, restaurant_id, category_ids, subcategory_ids)
+
+
+async def _parse(data_parser: DataParser, chunksize: int | None, parsed: StageQueue) -> None:
+    # Stage 1: read and index the chunks in a thread
+    chunks = data_parser.iter_chunks(chunksize)
+    while (chunk := await asyncio.to_thread(_next_chunk, chunks)) is not None:
+        await parsed.put(chunk)
+    await parsed.put(None)
+
+
+async def _categorize(session: AsyncSession, categorizer, existing_items: ExistingItems | None,
+                      category_ids: Dict[str, int], subcategory_ids: Dict[str, int],
+                      parsed: StageQueue, categorized: StageQueue) -> None:
+    # Stage 2: create the new restaurants, then deduplicate and label the items of every restaurant in a thread
+    handler = EntityHandler(session.sync_session)
+    restaurant_ids: Dict[str, int] = {}
+    while (chunk := await parsed.get()) is not None:
+        restaurants_names = chunk.get_restaurants_names()
+        new_restaurants = [name for name in restaurants_names if name not in restaurant_ids]
+        if new_restaurants:
+            restaurant_ids.update(await session.run_sync(
+                lambda _: handler.get_or_create_entities(new_restaurants, 'Restaurant')))
+            # The writer uses its own connection, it only sees committed restaurants
+            await session.commit()
+
+        for restaurant_name in restaurants_names:
+            restaurant_id = restaurant_ids[restaurant_name]
+            restaurant_menu, records = await asyncio.to_thread(_build_records, chunk, restaurant_name, categorizer,
+                                                               restaurant_id, category_ids, subcategory_ids,
+                                                               existing_items)
+            await categorized.put((restaurant_menu, restaurant_id, records))
+    await categorized.put(None)
+
+
+async def _write(session: AsyncSession, writer, existing_items: ExistingItems | None, categorized: StageQueue,
+                 stats: Dict[str, Any]) -> None:
+    '''
+    Stage 3: write and commit the items of every restaurant, a failed restaurant is rolled back and reported.
+    Items are remembered as existing only once they are committed, so the items of a failed restaurant
+    are written again if they appear in a later chunk
+    '''
+    item: Tuple[RestaurantMenuHandler, int, List[ItemRecord]] | None
+    while (item := await categorized.get()) is not None:
+        restaurant_menu, restaurant_id, records = item
+        start_time = time.perf_counter()
+        if existing_items is not None:
+            # Written by the previous restaurants since the records were built (the same restaurant in earlier chunks)
+            records = [record for record in records if (restaurant_id, record[0]['name']) not in existing_items]
+        try:
+            with metrics.timer('write_items'):
+                written = await session.run_sync(lambda _: writer.write(records))
+            if written:
+                with metrics.timer('refresh_stats'):
+                    await session.run_sync(refresh_nutrition_stats, [restaurant_id])
+            with metrics.timer('commit'):
+                await session.commit()
+        except Exception as exception:
+            await session.rollback()
+            stats['failed'][restaurant_menu.name] = repr(exception)
+            continue
+        if existing_items is not None:
+            existing_items.add(restaurant_id, [values['name'] for values, _ in records])
+        _record(stats, 'writer', 1, {'inserted': written, 'updated': 0,
+                                     'skipped': len(restaurant_menu.data) - written},
+                time.perf_counter() - start_time)
+
+
+async def load_restaurants_data_async(filename: str, mode: str = 'bulk', batch_size: int = DEFAULT_BATCH_SIZE,
+                                      chunksize: int | None = None, dedup: str = 'preload',
+                                      queue_size: int = DEFAULT_QUEUE_SIZE,
+                                      rules_file: str | None = None, match_cache_file: str | None = None,
+                                      csv_engine: str = 'c', reader: str = 'pandas') -> Dict[str, Any]:
+    '''
+    Load food items from CSV to DB with an asyncio pipeline on the async engine of the DB
+    (aiosqlite or asyncpg, see session.async_drivers): chunks are parsed, categorized and written
+    by three concurrent stages, so chunk N+1 is parsed and categorized while chunk N is written.
+    Parsing and categorization run in threads, the writes run the item writers of data_loader
+    on the async connection.
+    queue_size: chunks (parsed) and restaurants (categorized) waiting between two stages; full queues
+    stop the earlier stages, so at most about 2 * queue_size chunks are in memory
+
+    The other arguments are those of data_loader.load_restaurants_data_from_csv_to_db (without workers,
+    incremental loads and the copy mode).
+    Returns the same statistics, with the depth of every queue
+    '''
+    if mode not in async_load_modes:
+        raise ValueError(f'The async pipeline supports the load modes: {", ".join(async_load_modes)}')
+    if dedup not in dedup_modes:
+        raise ValueError(f'Unknown deduplication mode: {dedup}')
+    if dedup not in async_dedup_modes:
+        raise ValueError(f'The async pipeline supports the deduplication modes: {", ".join(async_dedup_modes)}')
+    if dedup == 'db' and mode == 'row':
+        raise ValueError('Deduplication in DB requires the bulk or copy mode')
+    if queue_size < 1:
+        raise ValueError('The queue size must be a positive number')
+    if csv_engine not in csv_engines:
+        raise ValueError(f'Unknown CSV engine: {csv_engine}')
+    if reader not in csv_readers:
+        raise ValueError(f'Unknown CSV reader: {reader}')
+
+    stats: Dict[str, Any] = {'inserted': 0, 'updated': 0, 'skipped': 0, 'workers': {}, 'failed': {}}
+    categorizer = _create_categorizer(rules_file, match_cache_file)
+    cache_hits, cache_misses = categorizer.match_cache.hits, categorizer.match_cache.misses
+
+    # One connection for the restaurants created by the categorize stage, one for the writer
+    engine = create_async_engine_from_config()
+    try:
+        async with AsyncSession(engine) as entity_session, AsyncSession(engine) as write_session:
+            handler = EntityHandler(entity_session.sync_session)
+            category_ids = await entity_session.run_sync(
+                lambda _: handler.get_or_create_entities(categories_list, 'Category'))
+            subcategory_ids = await entity_session.run_sync(
+                lambda _: handler.get_or_create_entities(categorizer.subcategories, 'SubCategory'))
+            existing_items = await entity_session.run_sync(ExistingItems) if dedup == 'preload' else None
+            await entity_session.commit()
+
+            writer = _create_writer(write_session.sync_session, mode, batch_size, dedup)
+            parsed = StageQueue('parsed', queue_size)
+            categorized = StageQueue('categorized', queue_size)
+            data_parser = _create_parser(filename, csv_engine, reader)
+            try:
+                async with asyncio.TaskGroup() as stages:
+                    stages.create_task(_parse(data_parser, chunksize, parsed))
+                    stages.create_task(_categorize(entity_session, categorizer, existing_items, category_ids,
+                                                   subcategory_ids, parsed, categorized))
+                    stages.create_task(_write(write_session, writer, existing_items, categorized, stats))
+            except ExceptionGroup as error:
+                # Raise the error of the failed stage, the other stages were cancelled
+                raise error.exceptions[0] from None
+            finally:
+                data_parser.close()
+    finally:
+        await engine.dispose()
+
+    stats['queues'] = {queue.name: queue.stats() for queue in (parsed, categorized)}
+    stats['match_cache'] = _match_cache_stats(categorizer, cache_hits, cache_misses)
+    return stats
+
+
+@metrics.timed('load')
+def run_async_load(filename: str, **options) -> Dict[str, Any]:
+    '''Run load_restaurants_data_async in a new event loop'''
+    return asyncio.run(load_restaurants_data_async(filename, **options))
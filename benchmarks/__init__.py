@@ -0,0 +1,4 @@
+'''
+Benchmarks of the loader and exporter: every module is a script (python benchmarks/<name>.py),
+synthetic.py generates the fastfood.csv-shaped input files and bench_suite.py runs all the stages end to end
+'''
@@ -0,0 +1,106 @@
+'''
+Micro-benchmark of the vectorized FoodCategorizer against the per-row reference rules of
+tests/test_categorization.py (which checks their parity), the matching time as the number of keywords grows,
+and the hit rate, bound and invalidation of the match cache.
+
+Usage: python benchmarks/bench_categorizer.py [rows]
+'''
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from categorization import FoodCategorizer, MatchCache  # noqa: E402
+from data_loader import category_rules, food_categorizer, subcategory_rules  # noqa: E402
+from rules import rules_hash  # noqa: E402
+from tests.test_categorization import per_row  # noqa: E402
+
+KEYWORD_COUNTS = [10, 100, 1000]
+KEYWORDS = ['Burger', 'Chicken Sandwich', 'Fish Taco', 'French Fries', 'Side Salad', 'Apple Pie',
+            'Ice Cream Cone', 'Ham Sub', 'Bacon Wrap', 'Nuggets 6 Piece', 'Coffee', 'Beef Bowl']
+
+
+def to_lists(categories: pd.Series, matrix: pd.DataFrame):
+    columns = np.array(matrix.columns)
+    return categories.tolist(), [columns[mask].tolist() for mask in matrix.to_numpy()]
+
+
+def keyword_scaling(rows: int) -> None:
+    # Distinct names, so every name is matched; the extra keywords never match
+    data = make_data(rows)
+    data['item'] = data['item'] + ' ' + pd.Series(np.arange(rows)).astype(str)
+    for count in KEYWORD_COUNTS:
+        extra = [f'zq{i}x' for i in range(count)]
+        rules = {name: {**rule, 'keywords': rule['keywords'] + extra} for name, rule in category_rules.items()}
+        categorizer = FoodCategorizer(rules, {name: keywords + extra for name, keywords in subcategory_rules.items()},
+                                      cache_dir=None)
+        start_time = time.perf_counter()
+        categorizer.categorize(data)
+        print(f'{count:>5} extra keywords per rule: {rows} distinct names in {time.perf_counter() - start_time:.3f} s')
+
+
+def check_match_cache(rows: int) -> None:
+    # Daily files repeat most names: categorize the same distinct names twice with a persisted cache
+    data = make_data(rows)
+    data['item'] = data['item'] + ' ' + pd.Series(np.arange(rows) % 1000).astype(str)
+    expected = to_lists(*FoodCategorizer(category_rules, subcategory_rules, cache_dir=None).categorize(data))
+    rules = (category_rules, subcategory_rules)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, 'matches.db')
+        for run in ('cold', 'warm'):
+            cache = MatchCache(rules_hash(*rules), file_name=file_name)
+            categorizer = FoodCategorizer(*rules, cache_dir=None, match_cache=cache)
+            assert to_lists(*categorizer.categorize(data)) == expected, 'Cached categorization differs'
+            cache.save()
+            print(f'match cache ({run}): {cache.stats()}')
+
+        # Other rules must not reuse the stored matches
+        other_rules = {**category_rules, 'Main': {**category_rules['Main'], 'keywords': ['burger']}}
+        assert MatchCache(rules_hash(other_rules, subcategory_rules), file_name=file_name).stats()['size'] == 0, \
+            'The match cache was not invalidated by a rule change'
+
+    bounded = MatchCache(rules_hash(*rules), max_size=100)
+    FoodCategorizer(*rules, cache_dir=None, match_cache=bounded).categorize(data)
+    assert bounded.stats()['size'] == 100, 'The match cache exceeds its size'
+
+
+def make_data(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'item': np.array(KEYWORDS)[rng.integers(0, len(KEYWORDS), rows)],
+        'calories': rng.integers(0, 1500, rows),
+        'protein': rng.integers(0, 60, rows),
+        'sugar': rng.integers(0, 80, rows),
+    })
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    check_match_cache(min(rows, 100_000))
+
+    data = make_data(rows)
+    start_time = time.perf_counter()
+    per_row(data)
+    row_time = time.perf_counter() - start_time
+
+    # The rules are compiled on first use, not timed
+    food_categorizer.automaton
+    start_time = time.perf_counter()
+    food_categorizer.categorize(data)
+    vectorized_time = time.perf_counter() - start_time
+
+    print(f'per-row:    {rows} rows in {row_time:.3f} s')
+    print(f'vectorized: {rows} rows in {vectorized_time:.3f} s')
+    print(f'speedup: {row_time / vectorized_time:.1f}x')
+
+    keyword_scaling(min(rows, 200_000))
+
+
+if __name__ == '__main__':
+    main()
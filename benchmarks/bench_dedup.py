@@ -0,0 +1,73 @@
+'''
+Benchmark of the deduplication modes on SQLite: re-load a file where half of the items
+already exist in DB, timing the lookup of existing items plus the bulk write of the new ones.
+
+Usage: python benchmarks/bench_dedup.py [restaurants] [items_per_restaurant]
+'''
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import RestaurantMenuHandler, column_list  # noqa: E402
+from deduplication import ExistingItems  # noqa: E402
+from item_writer import BulkItemWriter  # noqa: E402
+from models import Base, FoodItem, Restaurant  # noqa: E402
+
+
+def make_menu(restaurant: int, items: int) -> pd.DataFrame:
+    rows = [{column: i % 50 for column in column_list} for i in range(items)]
+    for i, row in enumerate(rows):
+        row.update(restaurant=f'Restaurant {restaurant}', item=f'Item {i}', salad='Other')
+    return pd.DataFrame(rows, columns=column_list)
+
+
+def records(menu: pd.DataFrame, restaurant_id: int):
+    return [({'name': name, 'calories': 100, 'restaurant_id': restaurant_id}, []) for name in menu['item']]
+
+
+def run(session, mode: str, menus) -> float:
+    start_time = time.perf_counter()
+    writer = BulkItemWriter(session, skip_existing=mode == 'db')
+    existing_items = ExistingItems(session) if mode == 'preload' else None
+    for restaurant_id, menu in menus.items():
+        if mode == 'db':
+            items = menu
+        elif mode == 'preload':
+            items = existing_items.filter_new(restaurant_id, menu)
+        else:
+            items = RestaurantMenuHandler(f'Restaurant {restaurant_id}', menu).get_nonexisted_items(session)
+        writer.write(records(items, restaurant_id))
+    elapsed_time = time.perf_counter() - start_time
+    session.rollback()
+    return elapsed_time
+
+
+def main():
+    restaurants = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp_dir, "bench.db")}')
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            session.execute(insert(Restaurant), [{'id': r, 'name': f'Restaurant {r}'} for r in range(1, restaurants + 1)])
+            # Half of every menu is already in DB
+            session.execute(insert(FoodItem), [{'name': f'Item {i}', 'restaurant_id': r}
+                                               for r in range(1, restaurants + 1) for i in range(items // 2)])
+            session.commit()
+
+            menus = {r: make_menu(r, items) for r in range(1, restaurants + 1)}
+            for mode in ('query', 'preload', 'db'):
+                elapsed_time = run(session, mode, menus)
+                print(f'{mode:>8}: {restaurants} restaurants x {items} items in {elapsed_time:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+'''
+Benchmark comparing the per-row ORM writer with the batched bulk writer on SQLite.
+
+Usage: python benchmarks/bench_item_writer.py [items] [batch_size]
+'''
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from item_writer import DEFAULT_BATCH_SIZE, BulkItemWriter, RowItemWriter  # noqa: E402
+from models import Base, Category, Restaurant, SubCategory  # noqa: E402
+
+
+def make_records(items: int, restaurant_id: int, category_id: int, subcategory_ids):
+    return [({'name': f'Item {i}', 'calories': i % 1000, 'total_carb': i % 80, 'salad': 'Other',
+              'restaurant_id': restaurant_id, 'category_id': category_id},
+             subcategory_ids[:i % 3]) for i in range(items)]
+
+
+def run(writer_class, items: int, **kwargs) -> float:
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        restaurant, category = Restaurant(name='Restaurant'), Category(name='Main')
+        subcategories = [SubCategory(name=name) for name in ('Beef', 'Chicken')]
+        session.add_all([restaurant, category, *subcategories])
+        session.flush()
+        records = make_records(items, restaurant.id, category.id, [s.id for s in subcategories])
+
+        start_time = time.perf_counter()
+        writer_class(session, **kwargs).write(records)
+        session.commit()
+        return time.perf_counter() - start_time
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_BATCH_SIZE
+
+    row_time = run(RowItemWriter, items)
+    bulk_time = run(BulkItemWriter, items, batch_size=batch_size)
+    print(f'row:  {items} items in {row_time:.3f} s ({items / row_time:.0f} items/s)')
+    print(f'bulk: {items} items in {bulk_time:.3f} s ({items / bulk_time:.0f} items/s), batch size {batch_size}')
+    print(f'speedup: {row_time / bulk_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''
+Memory-mapped reader (MappedDataParser) against the pandas reader (DataParser) on a synthetic file:
+time to index the restaurants, time to parse the rows of every restaurant with N threads
+and peak resident memory (VmHWM), compared with the file size.
+Every reader runs in a fresh process, so the peak memory of one does not hide the other.
+
+Usage: python benchmarks/bench_mmap.py [--size 10k|1m|10m|ROWS] [--restaurants N] [--workers 1,4]
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_csv, parse_size  # noqa: E402
+
+readers = ('pandas', 'mmap')
+
+
+def peak_rss_mb() -> float:
+    # Peak resident memory of this process (Linux)
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 2 ** 10
+    return float('nan')
+
+
+def run(path: str, reader: str, workers: int) -> Dict[str, Any]:
+    # Imported before the baseline: the peak is the memory of the reader only
+    from data_loader import _create_parser
+
+    baseline_mb = peak_rss_mb()
+    data_parser = _create_parser(path, 'c', reader)
+    start_time = time.perf_counter()
+    names = data_parser.get_restaurants_names()
+    index_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = sum(pool.map(lambda name: len(data_parser.get_restaurant_data(name)), names))
+    parse_seconds = time.perf_counter() - start_time
+    data_parser.close()
+    return {'rows': rows, 'index_seconds': index_seconds, 'parse_seconds': parse_seconds,
+            'peak_mb': peak_rss_mb() - baseline_mb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory-mapped reader against the pandas reader')
+    parser.add_argument('--size', default='1m', help='Number of rows or one of 10k, 1m, 10m')
+    parser.add_argument('--restaurants', type=int, default=100)
+    parser.add_argument('--workers', type=lambda value: [int(workers) for workers in value.split(',')],
+                        default=[1, 4], help='Comma-separated numbers of parsing threads')
+    parser.add_argument('--child', nargs=3, metavar=('PATH', 'READER', 'WORKERS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        path, reader, workers = args.child
+        print(json.dumps(run(path, reader, int(workers))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = generate_csv(os.path.join(tmp_dir, 'synthetic.csv'), parse_size(args.size), args.restaurants)
+        file_mb = os.path.getsize(path) / 2 ** 20
+        print(f'File: {file_mb:.1f} MB, {os.cpu_count()} CPUs')
+        print(f'{"reader":>8} {"workers":>8} {"rows":>10} {"index s":>10} {"parse s":>10} {"peak MB":>10}')
+        for reader in readers:
+            for workers in args.workers:
+                output = subprocess.run([sys.executable, __file__, '--child', path, reader, str(workers)],
+                                        capture_output=True, text=True, check=True).stdout
+                result = json.loads(output)
+                print(f'{reader:>8} {workers:>8} {result["rows"]:>10} {result["index_seconds"]:>10.3f} '
+                      f'{result["parse_seconds"]:>10.3f} {result["peak_mb"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Visualizer statistics read from restaurant_nutrition_stats vs the live GROUP BY over food_items
+on a synthetic SQLite database. The precomputed rows must match the live aggregation,
+also after a part of the restaurants is refreshed.
+
+Usage: python benchmarks/bench_nutrition_stats.py [items]   (default: 1M food items)
+'''
+import math
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_query_plan import RESTAURANTS, populate  # noqa: E402
+from models import Base, FoodItem, RestaurantNutritionStats  # noqa: E402
+from nutrition_stats import live_nutrition_stats, refresh_nutrition_stats, stats_columns  # noqa: E402
+
+
+def timed(function):
+    start_time = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start_time
+
+
+def compare(session) -> int:
+    live, live_time = timed(lambda: {row[0]: row for row in session.execute(live_nutrition_stats())})
+    cached, cached_time = timed(lambda: {row[0]: row for row in session.execute(
+        select(*[getattr(RestaurantNutritionStats, column) for column in stats_columns]))})
+    print(f'live GROUP BY: {live_time * 1000:.1f} ms, precomputed: {cached_time * 1000:.1f} ms '
+          f'({live_time / cached_time:.0f}x)')
+
+    mismatches = [restaurant_id for restaurant_id in live.keys() | cached.keys()
+                  if restaurant_id not in live or restaurant_id not in cached or not all(
+                      a == b or (a is not None and b is not None and math.isclose(a, b))
+                      for a, b in zip(live[restaurant_id], cached[restaurant_id]))]
+    print(f'{len(live)} restaurants, {len(mismatches)} mismatches')
+    return len(mismatches)
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp_dir, "bench.db")}')
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            populate(session, items)
+            _, elapsed_time = timed(lambda: refresh_nutrition_stats(session))
+            session.commit()
+            print(f'refreshed all restaurants in {elapsed_time * 1000:.1f} ms')
+            failed = compare(session)
+
+            # Change the items of a few restaurants, refresh only those ones
+            changed = list(range(1, RESTAURANTS + 1, 97))
+            session.execute(update(FoodItem).where(FoodItem.restaurant_id.in_(changed)).values(
+                calories=FoodItem.calories + 7, total_carb=None))
+            _, elapsed_time = timed(lambda: refresh_nutrition_stats(session, changed))
+            session.commit()
+            print(f'refreshed {len(changed)} restaurants in {elapsed_time * 1000:.1f} ms')
+            failed += compare(session)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''
+Benchmark for DataParser: the time to parse a file and walk every restaurant
+should grow linearly with the number of restaurants.
+
+Usage: python benchmarks/bench_parser.py
+'''
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import DataParser, column_list  # noqa: E402
+
+ITEMS_PER_RESTAURANT = 200
+RESTAURANT_COUNTS: List[int] = [10, 50, 100, 200, 400]
+
+
+def make_csv(path: str, restaurants: int, items: int = ITEMS_PER_RESTAURANT) -> None:
+    # Build a fastfood.csv-shaped file with interleaved restaurants
+    rows = []
+    for i in range(items):
+        for r in range(restaurants):
+            row = {column: i % 50 for column in column_list}
+            row.update(restaurant=f'Restaurant {r}', item=f'Item {i}', salad='Other')
+            rows.append(row)
+    pd.DataFrame(rows, columns=column_list).to_csv(path, index=False)
+
+
+def run(path: str) -> float:
+    start_time = time.perf_counter()
+    data_parser = DataParser(path)
+    for restaurant_name in data_parser.get_restaurants_names():
+        data_parser.get_restaurant_data(restaurant_name)
+    return time.perf_counter() - start_time
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f'{"restaurants":>12} {"rows":>10} {"seconds":>10} {"ms/restaurant":>14}')
+        for restaurants in RESTAURANT_COUNTS:
+            path = os.path.join(tmp_dir, f'bench_{restaurants}.csv')
+            make_csv(path, restaurants)
+            elapsed_time = run(path)
+            print(f'{restaurants:>12} {restaurants * ITEMS_PER_RESTAURANT:>10} '
+                  f'{elapsed_time:>10.3f} {elapsed_time / restaurants * 1000:>14.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Query-plan check of the hot query paths on a synthetic SQLite database:
+every query below must search its tables through an index instead of scanning them.
+
+Usage: python benchmarks/bench_query_plan.py [items]   (default: 10M food items)
+'''
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import categories_list, subcategories_list  # noqa: E402
+from data_processing import DataProcessor  # noqa: E402
+from item_writer import batched  # noqa: E402
+from models import Base, Category, FoodItem, FoodItemSubcategory, Restaurant, SubCategory  # noqa: E402
+
+RESTAURANTS = 1000
+INSERT_BATCH = 100_000
+
+
+def populate(session, items: int) -> None:
+    session.execute(insert(Restaurant), [{'id': r, 'name': f'Restaurant {r}'} for r in range(1, RESTAURANTS + 1)])
+    session.execute(insert(Category), [{'id': c, 'name': name} for c, name in enumerate(categories_list, 1)])
+    session.execute(insert(SubCategory), [{'id': s, 'name': name} for s, name in enumerate(subcategories_list, 1)])
+
+    rows = ({'id': i, 'name': f'Item {i}', 'calories': i % 1500, 'total_carb': i % 90,
+             'restaurant_id': i % RESTAURANTS + 1, 'category_id': i % 4 + 1} for i in range(1, items + 1))
+    for batch in batched(rows, INSERT_BATCH):
+        session.execute(insert(FoodItem), batch)
+
+    links = ({'food_item_id': i, 'subcategory_id': i % 5 + 1} for i in range(1, items + 1, 4))
+    for batch in batched(links, INSERT_BATCH):
+        session.execute(insert(FoodItemSubcategory), batch)
+    session.commit()
+    session.execute(text('ANALYZE'))
+
+
+def hot_queries(session):
+    # Deduplication lookup of RestaurantMenuHandler.get_existed_items_from_db
+    yield 'dedup lookup', ['food_items', 'restaurants'], select(FoodItem.name).join(Restaurant).where(
+        (Restaurant.name == 'Restaurant 7') & FoodItem.name.in_([f'Item {i}' for i in range(7, 7000, 1000)]))
+
+    # Statistics of one restaurant recomputed by refresh_nutrition_stats
+    yield 'restaurant statistics', ['food_items'], select(
+        func.avg(FoodItem.calories), func.min(FoodItem.calories), func.max(FoodItem.calories),
+        func.avg(FoodItem.total_carb)).join(Restaurant).where(Restaurant.name == 'Restaurant 7')
+
+    # Items of a category with their subcategories (DataProcessor.query)
+    yield 'export by category', ['food_items', 'food_item_subcategory', 'categories'], \
+        DataProcessor().query(session).filter(Category.name == 'Dessert').statement
+
+    yield 'items of a subcategory', ['food_item_subcategory', 'food_items'], select(FoodItem.name).join(
+        FoodItemSubcategory, FoodItemSubcategory.food_item_id == FoodItem.id).where(FoodItemSubcategory.subcategory_id == 3)
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp_dir, "bench.db")}')
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            start_time = time.perf_counter()
+            populate(session, items)
+            print(f'populated {items} food items in {time.perf_counter() - start_time:.1f} s')
+
+            failed = False
+            for name, searched_tables, statement in hot_queries(session):
+                sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+                plan = [row[-1] for row in session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+                start_time = time.perf_counter()
+                session.execute(statement).all()
+                elapsed_time = time.perf_counter() - start_time
+
+                scanned = [table for table in searched_tables if not any(
+                    step.startswith(f'SEARCH {table} ') and ('INDEX' in step or 'PRIMARY KEY' in step) for step in plan)]
+                failed |= bool(scanned)
+                status = 'OK' if not scanned else 'NOT INDEXED: ' + ', '.join(scanned)
+                print(f'{name}: {elapsed_time * 1000:.1f} ms {status}')
+                for step in plan:
+                    print(f'    {step}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+'''
+Memory profile of DataParser on a synthetic file: the default pandas dtypes with missing values
+replaced by SQL NULL objects (as read before csv_schema) against the compact schema-driven reader,
+with the C and the pyarrow engines.
+The peak of the traced allocations (numpy arrays and Python objects, not the buffers of pyarrow)
+is the memory needed to parse the file, the frame size is what stays in memory during the load.
+
+Usage: python benchmarks/bench_reader.py [--size 10k|1m|10m|ROWS] [--restaurants N]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlalchemy  # noqa: E402
+
+from benchmarks.synthetic import generate_csv, parse_size  # noqa: E402
+from data_loader import DataParser  # noqa: E402
+
+readers = ('default', 'schema', 'schema_pyarrow')
+
+
+def read(path: str, reader: str) -> pd.DataFrame:
+    if reader == 'default':
+        return pd.read_csv(path).fillna(sqlalchemy.sql.null())
+    return DataParser(path, 'pyarrow' if reader == 'schema_pyarrow' else 'c').read_csv()
+
+
+def run(path: str, reader: str) -> Dict[str, Any]:
+    # Timed without tracing, then parsed again under tracemalloc (which slows down the allocations)
+    start_time = time.perf_counter()
+    data_frame = read(path, reader)
+    seconds = time.perf_counter() - start_time
+    frame_mb = data_frame.memory_usage(deep=True).sum() / 2 ** 20
+    del data_frame
+
+    tracemalloc.start()
+    read(path, reader)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': seconds, 'frame_mb': frame_mb, 'peak_mb': peak / 2 ** 20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory profile of the CSV readers')
+    parser.add_argument('--size', default='1m', help='Number of rows or one of 10k, 1m, 10m')
+    parser.add_argument('--restaurants', type=int, default=100)
+    args = parser.parse_args()
+
+    try:
+        import pyarrow  # noqa: F401
+        selected = readers
+    except ImportError:
+        selected = readers[:-1]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = generate_csv(os.path.join(tmp_dir, 'synthetic.csv'), parse_size(args.size), args.restaurants)
+        print(f'{"reader":>15} {"seconds":>10} {"frame MB":>10} {"peak MB":>10}')
+        results = {reader: run(path, reader) for reader in selected}
+        for reader, result in results.items():
+            print(f'{reader:>15} {result["seconds"]:>10.3f} {result["frame_mb"]:>10.1f} {result["peak_mb"]:>10.1f}')
+
+    default = results['default']
+    for reader, result in results.items():
+        if reader != 'default':
+            print(f'{reader}: {default["frame_mb"] / result["frame_mb"]:.1f}x smaller frame, '
+                  f'{default["peak_mb"] / result["peak_mb"]:.1f}x lower peak, '
+                  f'{default["seconds"] / result["seconds"]:.1f}x faster parse')
+
+
+if __name__ == '__main__':
+    main()
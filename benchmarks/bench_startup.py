@@ -0,0 +1,59 @@
+'''
+Startup cost of the main.py commands measured with python -X importtime.
+Every command must stay under its import time budget and must not import the modules of other commands.
+
+Usage: python benchmarks/bench_startup.py [budget scale]   (e.g. 2 doubles the budgets on a slow host)
+'''
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+
+# Command: (modules it imports, import time budget in ms, modules it must not import)
+startup_paths = {
+    'parse the command line': (['main'], 75, ['pandas', 'numpy', 'sqlalchemy', 'matplotlib']),
+    'load': (['main', 'session', 'data_loader'], 1500, ['matplotlib', 'data_processing']),
+    'export': (['main', 'session', 'data_processing'], 1500, ['matplotlib', 'data_loader', 'categorization']),
+    'plot': (['main', 'data_processing', 'matplotlib.figure'], 2500, ['data_loader', 'categorization']),
+}
+
+
+def import_time(modules):
+    '''Total import time in ms (best of RUNS) and the names of all imported modules'''
+    best, imported = None, set()
+    for _ in range(RUNS):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules)}'],
+                                cwd=ROOT, capture_output=True, text=True, check=True)
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_time, _, module = line[len('import time:'):].split('|')
+            total += int(self_time)
+            imported.add(module.strip())
+        best = total if best is None else min(best, total)
+    return best / 1000, imported
+
+
+def main():
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+
+    failed = False
+    for name, (modules, budget, forbidden) in startup_paths.items():
+        elapsed, imported = import_time(modules)
+        unexpected = [module for module in forbidden if module in imported]
+        over_budget = elapsed > budget * scale
+        failed |= over_budget or bool(unexpected)
+
+        status = 'OK' if not over_budget and not unexpected else 'FAILED'
+        print(f'{name}: {elapsed:.0f} ms (budget {budget * scale:.0f} ms), {len(imported)} modules {status}')
+        if unexpected:
+            print(f'    imports {", ".join(unexpected)}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+'''
+End-to-end benchmark suite on a synthetic file: parse, categorize, insert, dedup (re-load of the same
+file), export and aggregate, on SQLite and on PostgreSQL when a URL is given.
+The results are written as JSON; --compare reports the stages slower than in an earlier result file.
+
+The PostgreSQL URL must point to a scratch database: the tables are dropped and created.
+
+Usage: python benchmarks/bench_suite.py [--size 10k|1m|10m|ROWS] [--restaurants N] [--keywords Burger=3,Coffee=1]
+                                        [--chunksize N] [--async]
+                                        [--postgres-url URL] [--output results.json] [--compare baseline.json]
+'''
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import default_keywords, generate_csv, parse_keywords, parse_size  # noqa: E402
+from async_loader import async_dedup_modes, run_async_load  # noqa: E402
+from data_loader import DataParser, food_categorizer, load_restaurants_data_from_csv_to_db  # noqa: E402
+from data_processing import DataVizualizer, export_items  # noqa: E402
+from models import Base  # noqa: E402
+from nutrition_stats import live_nutrition_stats, refresh_nutrition_stats  # noqa: E402
+from session import DBSession, configure, get_engine  # noqa: E402
+
+stages = ('parse', 'categorize', 'insert', 'dedup', 'export', 'aggregate')
+
+
+def timed(function: Callable[[], int]) -> Dict[str, Any]:
+    '''Run a benchmark returning its number of rows'''
+    start_time = time.perf_counter()
+    rows = function()
+    seconds = time.perf_counter() - start_time
+    return {'rows': rows, 'seconds': round(seconds, 6), 'rows_per_second': round(rows / seconds) if seconds else None}
+
+
+def bench_parse(path: str):
+    def parse():
+        data_parser = DataParser(path)
+        for restaurant_name in data_parser.get_restaurants_names():
+            data_parser.get_restaurant_data(restaurant_name)
+        return len(data_parser.data)
+    yield 'parse', timed(parse)
+
+
+def bench_categorize(path: str):
+    data = DataParser(path).data
+    yield 'categorize', timed(lambda: food_categorizer.categorize(data)[0].size)
+
+
+def bench_insert(path: str, mode: str, chunksize: int | None, use_async: bool):
+    if use_async:
+        yield f'insert_{mode}_async', timed(lambda: run_async_load(path, mode=mode, chunksize=chunksize)['inserted'])
+    else:
+        yield f'insert_{mode}', timed(
+            lambda: load_restaurants_data_from_csv_to_db(path, mode, chunksize=chunksize)['inserted'])
+
+
+def bench_dedup(path: str, use_async: bool):
+    # Every item of the file is already in DB, the time goes to finding them
+    if use_async:
+        for dedup in async_dedup_modes:
+            yield f'dedup_{dedup}_async', timed(lambda: run_async_load(path, dedup=dedup)['skipped'])
+        return
+    for dedup in ('preload', 'query', 'db'):
+        yield f'dedup_{dedup}', timed(lambda: load_restaurants_data_from_csv_to_db(path, dedup=dedup)['skipped'])
+
+
+def bench_export(tmp_dir: str):
+    with DBSession() as session:
+        yield 'export_csv', timed(lambda: export_items(session, os.path.join(tmp_dir, 'export.csv')))
+        yield 'export_csv_stream', timed(lambda: export_items(session, os.path.join(tmp_dir, 'stream.csv'), True))
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return
+        yield 'export_parquet', timed(lambda: export_items(session, os.path.join(tmp_dir, 'export.parquet')))
+
+
+def bench_aggregate():
+    with DBSession() as session:
+        yield 'aggregate_live', timed(lambda: len(session.execute(live_nutrition_stats()).all()))
+
+        def refresh():
+            refresh_nutrition_stats(session)
+            session.commit()
+            return len(session.execute(live_nutrition_stats()).all())
+        yield 'aggregate_refresh', timed(refresh)
+        yield 'aggregate_precomputed', timed(lambda: len(DataVizualizer().query(session)))
+
+
+def run_backend(backend: str, url: str, path: str, tmp_dir: str, selected: List[str], mode: str,
+                chunksize: int | None, use_async: bool):
+    configure(url)
+    engine = get_engine()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    benchmarks = {
+        'parse': lambda: bench_parse(path),
+        'categorize': lambda: bench_categorize(path),
+        'insert': lambda: bench_insert(path, mode, chunksize, use_async),
+        'dedup': lambda: bench_dedup(path, use_async),
+        'export': lambda: bench_export(tmp_dir),
+        'aggregate': bench_aggregate,
+    }
+    # The file does not depend on the DB, it is only parsed and categorized once
+    if backend != 'sqlite':
+        selected = [stage for stage in selected if stage not in ('parse', 'categorize')]
+    for stage in selected:
+        for name, result in benchmarks[stage]():
+            print(f'{backend} {name}: {result["rows"]} rows in {result["seconds"]:.3f} s', file=sys.stderr)
+            yield {'backend': backend, 'stage': name, **result}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], baseline_file: str, threshold: float) -> bool:
+    '''Print the time of every stage relative to the baseline, return whether one regressed'''
+    with open(baseline_file) as file:
+        baseline = {(result['backend'], result['stage']): result for result in json.load(file)['results']}
+
+    regressed = False
+    for result in results:
+        previous = baseline.get((result['backend'], result['stage']))
+        if not previous or not previous['seconds']:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        regressed |= ratio > threshold
+        status = 'REGRESSION' if ratio > threshold else 'OK'
+        print(f'{result["backend"]} {result["stage"]}: {previous["seconds"]:.3f} s -> {result["seconds"]:.3f} s '
+              f'({ratio:.2f}x) {status}', file=sys.stderr)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark suite on synthetic data')
+    parser.add_argument('--size', default='10k', help='Number of rows or one of 10k, 1m, 10m')
+    parser.add_argument('--restaurants', type=int, default=100)
+    parser.add_argument('--keywords', type=parse_keywords, default=None, help='Keyword weights, e.g. Burger=3,Coffee=1')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', default='bulk', help='Load mode of the insert stage')
+    parser.add_argument('--chunksize', type=int, default=None, help='Rows per chunk of the insert stage')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Insert and dedup with the asyncio pipeline (async_loader)')
+    parser.add_argument('--stages', type=lambda value: value.split(','), default=list(stages),
+                        help=f'Comma-separated stages (default: {",".join(stages)})')
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCH_POSTGRES_URL'),
+                        help='Scratch PostgreSQL database (default: BENCH_POSTGRES_URL)')
+    parser.add_argument('--output', help='JSON result file (default: standard output)')
+    parser.add_argument('--compare', help='Earlier JSON result file to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2, help='Slowdown reported as a regression')
+    args = parser.parse_args()
+
+    unknown = set(args.stages) - set(stages)
+    if unknown:
+        parser.error(f'Unknown stages: {", ".join(sorted(unknown))}')
+
+    rows = parse_size(args.size)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'dataset': {'rows': rows, 'restaurants': args.restaurants, 'seed': args.seed,
+                    'keywords': args.keywords or default_keywords},
+        'results': [],
+        'skipped': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = generate_csv(os.path.join(tmp_dir, 'synthetic.csv'), rows, args.restaurants, args.keywords,
+                            seed=args.seed)
+        report['dataset']['file_bytes'] = os.path.getsize(path)
+
+        backends = {'sqlite': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}'}
+        if args.postgres_url:
+            backends['postgresql'] = args.postgres_url
+
+        # The loader and exporter print their progress, standard output is kept for the JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            for backend, url in backends.items():
+                try:
+                    report['results'].extend(run_backend(backend, url, path, tmp_dir, args.stages, args.mode,
+                                                             args.chunksize, args.use_async))
+                except Exception as exception:
+                    # PostgreSQL is optional: an unreachable server is reported, not fatal
+                    if backend == 'sqlite':
+                        raise
+                    report['skipped'][backend] = repr(exception)
+                finally:
+                    # Dispose of the engine of this backend (configure drops it)
+                    configure()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare and compare(report['results'], args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
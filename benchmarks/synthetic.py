@@ -0,0 +1,116 @@
+'''
+Generator of fastfood.csv-shaped files: items spread over a configurable number of restaurants,
+names drawn from a weighted keyword distribution (which drives the categorization), random nutrition
+values with a share of missing ones and a share of items repeated within a restaurant.
+
+Usage: python benchmarks/synthetic.py FILE [--size 10k|1m|10m|ROWS] [--restaurants N]
+                                           [--keywords Burger=3,Coffee=1] [--seed N]
+'''
+import argparse
+import os
+import sys
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import column_list  # noqa: E402
+
+# Named sizes of the generated files
+sizes: Dict[str, int] = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Relative frequency of the keywords in item names, covering every category and subcategory rule
+default_keywords: Dict[str, float] = {
+    'Burger': 15, 'Chicken Sandwich': 12, 'Fish Taco': 5, 'Beef Bowl': 5, 'Ham Sub': 5, 'Bacon Wrap': 4,
+    'French Fries': 8, 'Side Salad': 6, 'Nuggets 6 Piece': 6, 'Apple Pie': 4, 'Ice Cream Cone': 5,
+    'Chocolate Cake': 3, 'Coffee': 7, 'Smoothie': 5, 'Veggie Wrap': 10,
+}
+
+# Nutrition columns: (low, high) of the generated values
+nutrition_ranges: Dict[str, tuple] = {
+    'calories': (10, 1500), 'cal_fat': (0, 900), 'total_fat': (0, 100), 'sat_fat': (0, 30), 'trans_fat': (0, 3),
+    'cholesterol': (0, 300), 'sodium': (0, 3000), 'total_carb': (0, 150), 'fiber': (0, 15), 'sugar': (0, 80),
+    'protein': (0, 100), 'vit_a': (0, 150), 'vit_c': (0, 150), 'calcium': (0, 100),
+}
+
+# Columns which may be missing (calories are always given, as in fastfood.csv)
+nullable_columns = ['fiber', 'sugar', 'protein', 'vit_a', 'vit_c', 'calcium']
+
+
+def parse_size(size: str) -> int:
+    return sizes[size.lower()] if size.lower() in sizes else int(size)
+
+
+def parse_keywords(keywords: str) -> Dict[str, float]:
+    '''Parse "Burger=3,Coffee=1" into keyword weights'''
+    weights = {}
+    for keyword in keywords.split(','):
+        name, _, weight = keyword.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def generate_chunk(rng: np.random.Generator, start: int, stop: int, rows: int, restaurants: int,
+                   keywords: Dict[str, float], duplicate_ratio: float, missing_ratio: float) -> pd.DataFrame:
+    numbers = np.arange(start, stop)
+    # Restaurants are contiguous blocks of rows like in fastfood.csv
+    restaurant_codes = numbers * restaurants // rows
+
+    names = np.array(list(keywords))
+    weights = np.array(list(keywords.values()), dtype=float)
+    keyword_codes = rng.choice(len(names), size=len(numbers), p=weights / weights.sum())
+
+    # A duplicated row repeats the item of the previous row in the same restaurant
+    duplicated = rng.random(len(numbers)) < duplicate_ratio
+    duplicated[0] = False
+    duplicated[1:] &= restaurant_codes[1:] == restaurant_codes[:-1]
+    item_numbers = numbers.copy()
+    for position in np.flatnonzero(duplicated):
+        item_numbers[position] = item_numbers[position - 1]
+        keyword_codes[position] = keyword_codes[position - 1]
+
+    data = {
+        'restaurant': pd.Series(restaurant_codes).map('Restaurant {}'.format),
+        'item': pd.Series(names[keyword_codes]) + ' #' + pd.Series(item_numbers).astype(str),
+    }
+    for column, (low, high) in nutrition_ranges.items():
+        values = rng.integers(low, high, size=len(numbers)).astype(float)
+        if column in nullable_columns:
+            values[rng.random(len(numbers)) < missing_ratio] = np.nan
+        data[column] = values
+    data['calories'] = data['calories'].astype(int)
+    data['salad'] = np.where(rng.random(len(numbers)) < 0.05, 'Salad', 'Other')
+    return pd.DataFrame(data, columns=column_list)
+
+
+def generate_csv(path: str, rows: int, restaurants: int = 100, keywords: Dict[str, float] | None = None,
+                 duplicate_ratio: float = 0.01, missing_ratio: float = 0.02, seed: int = 0,
+                 chunk_rows: int = 1_000_000) -> str:
+    '''Write a fastfood.csv-shaped file of the given number of rows, chunk by chunk'''
+    rng = np.random.default_rng(seed)
+    restaurants = max(1, min(restaurants, rows))
+    for start in range(0, rows, chunk_rows):
+        chunk = generate_chunk(rng, start, min(start + chunk_rows, rows), rows, restaurants,
+                               keywords or default_keywords, duplicate_ratio, missing_ratio)
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a fastfood.csv-shaped file')
+    parser.add_argument('file')
+    parser.add_argument('--size', default='10k', help=f'Number of rows or one of {", ".join(sizes)}')
+    parser.add_argument('--restaurants', type=int, default=100)
+    parser.add_argument('--keywords', type=parse_keywords, default=None, help='Keyword weights, e.g. Burger=3,Coffee=1')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = parse_size(args.size)
+    generate_csv(args.file, rows, args.restaurants, args.keywords, seed=args.seed)
+    print(f'{args.file}: {rows} rows, {args.restaurants} restaurants')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from rules import CATEGORY_PRECEDENCE, RULES_CACHE_DIR, KeywordAutomaton, compile_rules, rules_hash
+
+# Number of item names kept by the match cache
+MATCH_CACHE_SIZE = 100_000
+
+
+class MatchCache:
+    '''
+    Bounded LRU cache of the rules matched by an item name (normalized: lower-cased),
+    so names repeated across restaurants and files are matched once.
+    Only the keyword matches are cached, the nutrition thresholds are applied to every row.
+    Optionally persisted in a SQLite file between runs; the file belongs to one rule set
+    and is emptied when the rules change (different hash)
+    '''
+    def __init__(self, rules_hash: str, max_size: int = MATCH_CACHE_SIZE, file_name: str | None = None) -> None:
+        self.rules_hash = rules_hash
+        self.max_size = max_size
+        self.file_name = file_name
+        self.hits = 0
+        self.misses = 0
+        self._masks: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        if file_name is not None:
+            self._load()
+
+    def lookup(self, names: List[str], match: Callable[[str], int]) -> List[int]:
+        '''Masks of the given (normalized) names, the missing ones are computed with match and cached'''
+        cached = self._masks
+        get, move_to_end = cached.get, cached.move_to_end
+        masks, misses = [], 0
+        with self._lock:
+            for name in names:
+                mask = get(name)
+                if mask is None:
+                    misses += 1
+                    mask = cached[name] = match(name)
+                else:
+                    move_to_end(name)
+                masks.append(mask)
+            # Evict the least recently used names
+            for _ in range(len(cached) - self.max_size):
+                cached.popitem(last=False)
+            self.hits += len(names) - misses
+            self.misses += misses
+        return masks
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._masks),
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None}
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.file_name)
+        connection.execute('CREATE TABLE IF NOT EXISTS rules (rules_hash TEXT NOT NULL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS matches (position INTEGER PRIMARY KEY, name TEXT NOT NULL, '
+                           'mask INTEGER NOT NULL)')
+        return connection
+
+    def _load(self) -> None:
+        with self._connect() as connection:
+            stored_hash = connection.execute('SELECT rules_hash FROM rules').fetchone()
+            # Matches of other rules are invalid
+            if stored_hash is None or stored_hash[0] != self.rules_hash:
+                return
+            rows = connection.execute('SELECT name, mask FROM matches ORDER BY position DESC LIMIT ?', (self.max_size,))
+            self._masks.update((name, mask) for name, mask in reversed(rows.fetchall()))
+        connection.close()
+
+    def save(self) -> None:
+        '''Store the cached matches (least recently used first) in the cache file'''
+        if self.file_name is None:
+            return
+        with self._lock, self._connect() as connection:
+            connection.execute('DELETE FROM rules')
+            connection.execute('DELETE FROM matches')
+            connection.execute('INSERT INTO rules (rules_hash) VALUES (?)', (self.rules_hash,))
+            connection.executemany('INSERT INTO matches (position, name, mask) VALUES (?, ?, ?)',
+                                   ((position, name, mask) for position, (name, mask) in enumerate(self._masks.items())))
+        connection.close()
+
+
+class FoodCategorizer:
+    '''
+    Vectorized categorization of a whole DataFrame of food items.
+    The keywords of all rules are compiled once, on first use, into an Aho-Corasick automaton (see rules.py), every
+    distinct item name (lower-cased once) is matched in a single pass whatever the number of keywords,
+    numeric thresholds are combined as NumPy boolean masks with the same precedence as the per-row
+    rules of the original loader (Side -> Main -> Dessert -> Other, see tests/test_categorization.py)
+    '''
+    def __init__(self, category_rules: Dict[str, Dict[str, Any]], subcategory_rules: Dict[str, List[str]],
+                 cache_dir: str | None = RULES_CACHE_DIR, match_cache: MatchCache | None = None):
+        self.category_rules = category_rules
+        self.subcategories: List[str] = [*subcategory_rules, 'Other']
+        self.subcategory_rules = subcategory_rules
+        self.cache_dir = cache_dir
+        self.rules_hash = rules_hash(category_rules, subcategory_rules)
+        self._automaton: KeywordAutomaton | None = None
+        self._automaton_lock = threading.Lock()
+        self.match_cache = match_cache if match_cache is not None else MatchCache(self.rules_hash)
+        if self.match_cache.rules_hash != self.rules_hash:
+            raise ValueError('The match cache belongs to other rules')
+
+    @property
+    def automaton(self) -> KeywordAutomaton:
+        # Compiled (or read from the rules cache) by the first categorization, not when the categorizer is created
+        if self._automaton is None:
+            with self._automaton_lock:
+                if self._automaton is None:
+                    self._automaton = compile_rules(self.category_rules, self.subcategory_rules, self.cache_dir)
+        return self._automaton
+
+    def _match(self, names: pd.Series, codes: np.ndarray) -> np.ndarray:
+        # Bit masks of the matched rules for the distinct names, spread over the rows (code -1 is a missing name)
+        is_name = names.map(lambda name: isinstance(name, str)).to_numpy(dtype=bool)
+        masks = np.zeros(len(names) + 1, dtype=np.int64)
+        masks[:-1][is_name] = self.match_cache.lookup(names[is_name].tolist(), self.automaton.match)
+        return masks[codes]
+
+    def _contains(self, masks: np.ndarray, rule_name: str) -> np.ndarray:
+        return (masks & self.automaton.bit(rule_name)) != 0
+
+    @staticmethod
+    def _numeric(data: pd.DataFrame, column: str) -> np.ndarray:
+        # Missing values (NA, NaN or SQL NULL) never satisfy a threshold
+        return pd.to_numeric(data[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+    def categorize(self, data: pd.DataFrame) -> Tuple[pd.Series, pd.DataFrame]:
+        '''
+        Return the category of every item and a multi-hot matrix of subcategories
+        (one boolean column per subcategory, only Main items have subcategories)
+        '''
+        codes, names = pd.factorize(data['item'])
+        names = pd.Series(names, dtype=object).str.lower()
+        calories = self._numeric(data, 'calories')
+        protein = self._numeric(data, 'protein')
+        sugar = self._numeric(data, 'sugar')
+
+        masks = self._match(names, codes)
+
+        side, main, dessert = (self.category_rules[name] for name in CATEGORY_PRECEDENCE)
+        with np.errstate(invalid='ignore'):
+            is_side = self._contains(masks, 'category:Side') & (
+                (calories < side['calories']) | (protein <= side['protein']) | (sugar <= side['sugar']))
+            is_main = self._contains(masks, 'category:Main') | (calories > main['calories'])
+            is_dessert = self._contains(masks, 'category:Dessert') | (sugar > dessert['sugar'])
+
+        categories = pd.Series(
+            np.select([is_side, is_main, is_dessert], CATEGORY_PRECEDENCE, default='Other'),
+            index=data.index, name='category')
+
+        # Subcategories are only attached to Main items
+        is_main_category = (categories == 'Main').to_numpy()
+        matrix = np.zeros((len(data), len(self.subcategories)), dtype=bool)
+        for position, name in enumerate(self.subcategories[:-1]):
+            matrix[:, position] = self._contains(masks, f'subcategory:{name}')
+        matrix[:, -1] = ~matrix[:, :-1].any(axis=1)
+        matrix &= is_main_category[:, None]
+
+        return categories, pd.DataFrame(matrix, index=data.index, columns=self.subcategories)
@@ -0,0 +1,26 @@
+from typing import Any, Dict
+from sqlalchemy import delete, insert, select, update
+from models import LoadCheckpoint
+
+
+def get_checkpoint(session, content_hash: str) -> LoadCheckpoint | None:
+    return session.scalars(select(LoadCheckpoint).where(LoadCheckpoint.file_hash == content_hash)).first()
+
+
+def save_checkpoint(session, content_hash: str, file_name: str, chunksize: int | None, row_offset: int,
+                    restaurant: str, rows: int) -> None:
+    '''
+    Record the progress of a file in the session transaction, so that it is committed with the items
+    it describes: everything up to the restaurant of the chunk starting at row_offset is in DB
+    '''
+    values: Dict[str, Any] = {'file_name': file_name, 'chunksize': chunksize, 'row_offset': row_offset,
+                              'restaurant': restaurant, 'rows': rows}
+    table = LoadCheckpoint.__table__
+    if not session.execute(update(table).where(table.c.file_hash == content_hash).values(**values)).rowcount:
+        session.execute(insert(table).values(file_hash=content_hash, **values))
+
+
+def clear_checkpoint(session, content_hash: str) -> None:
+    # The file is fully loaded, a new load starts from the beginning
+    table = LoadCheckpoint.__table__
+    session.execute(delete(table).where(table.c.file_hash == content_hash))
@@ -0,0 +1,62 @@
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+
+column_list: List = ('restaurant', 'item', 'calories', 'cal_fat', 'total_fat', 'sat_fat', 'trans_fat',
+                      'cholesterol', 'sodium', 'total_carb', 'fiber', 'sugar', 'protein', 'vit_a', 'vit_c', 'calcium', 'salad')
+
+# Columns holding text, the other ones are numbers
+text_columns: List = ('restaurant', 'item', 'salad')
+
+# Compact dtypes of the CSV columns: the few distinct restaurant and salad values are stored once as
+# categories, numbers as float32 (NaN for missing values, half the memory of the default float64).
+# float32 holds the whole numbers of the file exactly up to 2 ** 24 and other values to 7 significant digits;
+# calories are parsed as floats too, so large and fractional values are read, and stored as integers
+# when they are written to DB (see db_values)
+csv_dtypes: Dict[str, str] = {
+    'restaurant': 'category',
+    'item': 'object',
+    **{column: 'float32' for column in column_list[2:-1]},
+    'salad': 'category',
+}
+
+# Number columns stored as integers in DB
+integer_columns: List = ('calories',)
+
+
+def exact_floats(values: pd.Series) -> np.ndarray:
+    '''
+    Numbers of a column as float64, missing values as NaN.
+    Fractional float32 values go through their shortest decimal representation, so 1.1 read as float32
+    is 1.1 again (and not 1.100000023841858), as it was read from the file; whole numbers are exact
+    '''
+    values = pd.to_numeric(values, errors='coerce')
+    if values.dtype != np.float32:
+        return values.to_numpy(dtype=float, na_value=np.nan)
+    floats = values.to_numpy()
+    result = floats.astype(float)
+    # Only the fractional values (usually a few) are converted through text
+    fractional = np.flatnonzero(np.isfinite(floats) & (floats != np.trunc(floats)))
+    result[fractional] = floats[fractional].astype(str).astype(float)
+    return result
+
+
+def db_values(data: pd.DataFrame, columns: List[str]) -> List[Dict[str, Any]]:
+    '''
+    Rows of the given columns as dicts of Python values ready to be written to DB.
+    This is where missing values (NA, NaN) become NULL (None) and whole numbers of the integer columns
+    become int (a fractional value is kept as it is), the frame itself keeps its compact dtypes
+    '''
+    values = []
+    for column in columns:
+        if pd.api.types.is_float_dtype(data[column].dtype):
+            floats = exact_floats(data[column])
+            column_values = floats.astype(object)
+            column_values[np.isnan(floats)] = None
+            if column in integer_columns:
+                whole = np.isfinite(floats) & (floats == np.trunc(floats))
+                column_values[whole] = floats[whole].astype(np.int64).astype(object)
+            values.append(column_values)
+        else:
+            values.append(data[column].to_numpy(dtype=object, na_value=None))
+    return [dict(zip(columns, row)) for row in zip(*values)]
@@ -1,8 +1,27 @@
-from typing import Any, Dict, List
+import io
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterator, List, Tuple
+import numpy as np
 import pandas as pd
-import sqlalchemy
-from models import Restaurant, Category, FoodItem, SubCategory, FoodItemSubcategory
-from session import DBSession
+from models import Restaurant, Category, FoodItem, SubCategory, LoadManifest
+from sqlalchemy.orm import sessionmaker
+from session import DBSession, create_pooled_engine, get_engine
+from categorization import FoodCategorizer, MatchCache
+from csv_schema import column_list, csv_dtypes, db_values, text_columns
+from rules import load_rules, rules_hash
+from load_options import DEFAULT_BATCH_SIZE, csv_engines, csv_readers, dedup_modes, load_modes
+from metrics import metrics
+from mmap_reader import MappedCSV
+from deduplication import ExistingItems
+from dimensions import DimensionCache
+from incremental import ItemHashes, file_hash, hash_number_columns, hash_text_columns, is_file_loaded, row_hashes
+from checkpoints import clear_checkpoint, get_checkpoint, save_checkpoint
+from nutrition_stats import refresh_nutrition_stats
+from item_writer import BulkItemWriter, CopyItemWriter, ItemRecord, RowItemWriter
 
 
 '''
@@ -34,18 +53,30 @@ subcategory_rules: Dict[str, List[str]] = {
 categories_list: List = ['Main', 'Side', 'Dessert', 'Other']
 subcategories_list: List = [
     'Beef', 'Chicken', 'Seafood', 'Pork', 'Other']
-column_list: List = ('restaurant', 'item', 'calories', 'cal_fat', 'total_fat', 'sat_fat', 'trans_fat',
-                      'cholesterol', 'sodium', 'total_carb', 'fiber', 'sugar', 'protein', 'vit_a', 'vit_c', 'calcium', 'salad')
+# Vectorized engine applying the rules above to a whole DataFrame
+food_categorizer = FoodCategorizer(category_rules, subcategory_rules)
+
+# CSV columns stored as is in the food_items table
+food_item_columns: List = column_list[2:]
+
+# Extensions of the files pandas decompresses, they are never memory-mapped
+compressed_extensions = ('.gz', '.bz2', '.zip', '.xz', '.zst', '.tar')
 
 
 class RestaurantMenuHandler:
-    def __init__(self, name: str, restarunt_data: pd.DataFrame):
+    def __init__(self, name: str, restarunt_data: pd.DataFrame, categorizer: FoodCategorizer = food_categorizer):
         self.name = name
         self.data = restarunt_data  # data from CSV
+        self.categorizer = categorizer
 
     def get_items_names(self) -> List[str]:
         return self.data['item'].tolist()
 
+    def get_unique_items(self) -> pd.DataFrame:
+        # An item name may only be stored once per restaurant, the first row wins
+        return self.data.drop_duplicates('item')
+
+    @metrics.timed('dedup_query')
     def get_existed_items_from_db(self, session) -> set:
 
         # Fetch names of existing food items from the database for a specific restaurant and a specific list of food items
@@ -60,101 +91,189 @@ class RestaurantMenuHandler:
         return set(self.get_items_names()) - self.get_existed_items_from_db(session)
 
     def get_nonexisted_items(self, session) -> pd.DataFrame:
-        return self.data[self.data['item'].isin(self.find_nonexisted_items(session))]
-
-    @staticmethod
-    def _categorize_food(row: pd.Series) -> str:
-
-        if any(kword in row['item'].lower() for kword in category_rules['Side']['keywords']) and (row['calories'] < category_rules['Side']['calories'] or row['protein'] <= category_rules['Side']['protein'] or row['sugar'] <= category_rules['Side']['sugar']):
-            return 'Side'
-        elif any(kword in row['item'].lower() for kword in category_rules['Main']['keywords']) or row['calories'] > category_rules['Main']['calories']:
-            return 'Main'
-        elif any(kword in row['item'].lower() for kword in category_rules['Dessert']['keywords']) or row['sugar'] > category_rules['Dessert']['sugar']:
-            return 'Dessert'
-        else:
-            return 'Other'
-
-    @staticmethod
-    def _subcategorize_main_food(row: pd.Series) -> List[str]:
-
-        subCategories: List[str] = []
-
-        if any(kword in row['item'].lower() for kword in subcategory_rules['Beef']):
-            subCategories.append('Beef')
-        if any(kword in row['item'].lower() for kword in subcategory_rules['Chicken']):
-            subCategories.append('Chicken')
-        if any(kword in row['item'].lower() for kword in subcategory_rules['Seafood']):
-            subCategories.append('Seafood')
-        if any(kword in row['item'].lower() for kword in subcategory_rules['Pork']):
-            subCategories.append('Pork')
-
-        if not subCategories:
-            subCategories.append('Other')
-        return subCategories
-
-    def attach_category_and_subcategories(self, item_row: pd.Series,
-                                          categories_dict: Dict[str, Category],
-                                          subcategories_dict: Dict[str, SubCategory]) -> List[Category | List[SubCategory]]:
+        items = self.get_unique_items()
+        return items[items['item'].isin(self.find_nonexisted_items(session))]
+
+    @metrics.timed('content_hash')
+    def get_content_hashes(self, items: pd.DataFrame) -> pd.Series:
+        # Hash of the restaurant, item name and nutrition values of every row
+        return row_hashes(items, hash_text_columns, hash_number_columns)
+
+    @metrics.timed('categorize')
+    def build_item_records(self, items: pd.DataFrame, restaurant_id: int,
+                           category_ids: Dict[str, int],
+                           subcategory_ids: Dict[str, int],
+                           content_hashes: pd.Series | None = None) -> List[ItemRecord]:
         '''
-        Attach a category and subcategories to a food item
+        Build the column values and subcategory ids of food items ready to be written to DB.
+        Their content hashes are computed unless given, so that a later incremental load only updates
+        the items which changed
         '''
-        # Get the item category
+        # Label all the items at once
+        categories, subcategories = self.categorizer.categorize(items)
+        subcategory_ids = np.array([subcategory_ids[name] for name in subcategories.columns])
 
-        category = categories_dict.get(self._categorize_food(item_row))
-        # Get the item subcategories if the category is Main
-        subcategories = [subcategories_dict.get(name) for name in self._subcategorize_main_food(
-            item_row)] if category.name == 'Main' else []
-        return category, subcategories
+        records: List[ItemRecord] = []
+        # Missing values become NULL here, when the rows leave the frame
+        for values, name, category_name, subcategory_mask in zip(
+                db_values(items, food_item_columns), items['item'], categories, subcategories.to_numpy()):
+            values.update(name=name, restaurant_id=restaurant_id, category_id=category_ids[category_name])
+            records.append((values, subcategory_ids[subcategory_mask].tolist()))
+
+        if content_hashes is None:
+            content_hashes = self.get_content_hashes(items)
+        for (values, _), content_hash in zip(records, content_hashes):
+            values['content_hash'] = content_hash
+        return records
 
 
 class EntityHandler:
     '''
-    Universal entity handler for creating and getting entities (restaurants, categories, subcategories) in DB
+    Universal entity handler for creating and getting entities (restaurants, categories, subcategories) in DB.
+    The names and ids of each entity type are loaded once (see dimensions.DimensionCache).
+    With the dimension caches of LoadCaches, shared with other loaders, new entities are created and committed
+    at once on a session of their own, the transaction of the loader is left for it to commit
     '''
-    def __init__(self, session) -> None:
+    def __init__(self, session, dimensions: Dict[str, DimensionCache] | None = None) -> None:
         self.session = session
+        self.shared = dimensions is not None
+        self.dimensions = dimensions if dimensions is not None else new_dimensions()
+
+    @metrics.timed('entities')
+    def get_or_create_entities(self, entities: List[str], entity_type: str) -> Dict[str, int]:
+        '''Return the ids of the entities by name, the missing ones are created'''
+        if not self.shared:
+            return self.dimensions[entity_type].get_or_create(self.session, entities)
+        # A session of the engine, not of the connection the loader session may be bound to
+        with DBSession(sessionmaker(bind=self.session.get_bind().engine)) as entity_session:
+            return self.dimensions[entity_type].get_or_create(entity_session, entities, commit=True)
 
-    def get_or_create_entities(self, entities: List[str], entity_type: str) -> Dict[str, Any]:
-
-        if entity_type == 'Restaurant':
-            existing_entities = {
-                entity.name: entity for entity in self.session.query(Restaurant).all()}
-            Entity = Restaurant
-        elif entity_type == 'Category':
-            existing_entities = {
-                entity.name: entity for entity in self.session.query(Category).all()}
-            Entity = Category
-        elif entity_type == 'SubCategory':
-            existing_entities = {
-                entity.name: entity for entity in self.session.query(SubCategory).all()}
-            Entity = SubCategory
-
-        for _entity in entities:
-            entity = existing_entities.get(_entity)
-            if not entity:
-                entity = Entity(name=_entity)
-                self.session.add(entity)
-                existing_entities[_entity] = entity
-        self.session.flush()
-        return existing_entities
+
+def new_dimensions() -> Dict[str, DimensionCache]:
+    return {'Restaurant': DimensionCache(Restaurant), 'Category': DimensionCache(Category),
+            'SubCategory': DimensionCache(SubCategory)}
+
+
+class LoadCaches:
+    '''
+    Caches shared by the loads of several files (see file_scheduler): ids of the entities, names
+    (or content hashes) of the items in DB, loaded on first use, and the categorizer with its match cache.
+    Items are claimed when they are filtered rather than once committed, so files loaded at the same
+    time never insert the same item twice; the claims of a rolled back transaction are released
+    (see _release_claims)
+    '''
+    def __init__(self, categorizer: FoodCategorizer = food_categorizer) -> None:
+        self.categorizer = categorizer
+        self.dimensions = new_dimensions()
+        self._existing_items: ExistingItems | None = None
+        self._item_hashes: ItemHashes | None = None
+        self._lock = threading.Lock()
+
+    def existing_items(self, session) -> ExistingItems:
+        with self._lock:
+            if self._existing_items is None:
+                self._existing_items = ExistingItems(session)
+            return self._existing_items
+
+    def item_hashes(self, session) -> ItemHashes:
+        with self._lock:
+            if self._item_hashes is None:
+                self._item_hashes = ItemHashes(session)
+            return self._item_hashes
+
+
+class CommitBatch:
+    '''
+    Restaurants written in the current transaction of a serial load. They are committed together once
+    commit_rows rows or commit_bytes bytes (of the parsed rows in memory) are written, or after every
+    restaurant without these limits. With a content_hash, every commit records the checkpoint of the last
+    restaurant in the same transaction (see checkpoints.py). claimed holds the items claimed in shared indexes
+    by the restaurants of the batch until they are committed. Every commit then empties the session
+    (expunge_all), so that the ORM objects of the batch do not pile up in its identity map during a long load
+    '''
+    def __init__(self, session, commit_rows: int | None = None, commit_bytes: int | None = None,
+                 content_hash: str | None = None, file_name: str | None = None, chunksize: int | None = None,
+                 committed_rows: int = 0) -> None:
+        self.session = session
+        self.commit_rows = commit_rows
+        self.commit_bytes = commit_bytes
+        self.content_hash = content_hash
+        self.file_name = file_name
+        self.chunksize = chunksize
+        self.committed_rows = committed_rows
+        self.rows = 0
+        self.bytes = 0
+        self.position: Tuple[int, str] | None = None
+        self.claimed: List[Tuple[int, pd.Series]] = []
+
+    def add(self, row_offset: int, restaurant_menu: RestaurantMenuHandler) -> None:
+        '''Add a written restaurant of the chunk starting at row_offset, commit the batch if it is full'''
+        self.rows += len(restaurant_menu.data)
+        if self.commit_bytes is not None:
+            self.bytes += int(restaurant_menu.data.memory_usage(deep=True).sum())
+        self.position = (row_offset, restaurant_menu.name)
+        if self.commit_rows is None and self.commit_bytes is None or \
+                self.commit_rows is not None and self.rows >= self.commit_rows or \
+                self.commit_bytes is not None and self.bytes >= self.commit_bytes:
+            self.commit()
+
+    def commit(self) -> None:
+        if self.position is None:
+            return
+        if self.content_hash is not None:
+            save_checkpoint(self.session, self.content_hash, self.file_name, self.chunksize, *self.position,
+                            self.committed_rows + self.rows)
+        with metrics.timer('commit'):
+            self.session.commit()
+        self.session.expunge_all()
+        self.committed_rows += self.rows
+        self.rows, self.bytes, self.position = 0, 0, None
+        self.claimed.clear()
 
 
 class DataParser:
     '''
-    Data parser for reading and validating the data from CSV
+    Data parser for reading and validating the data from CSV.
+    The file is read and validated once, then the rows are reordered so that every restaurant
+    occupies a contiguous slice of the frame and per-restaurant data can be returned as a view
     '''
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, engine: str = 'c'):
         self.filename = filename
+        self.engine = engine
+        self._data: pd.DataFrame | None = None
+        self._restaurant_index: Dict[str, slice] | None = None
+        # Rows of the file before this chunk
+        self.row_offset = 0
 
-    def read_csv(self) -> pd.DataFrame:
-        # Read the CSV file
+    def _read_options(self) -> Dict[str, Any]:
+        '''
+        Only the columns of column_list are read, with the compact dtypes of csv_dtypes.
+        The header is read first: columns missing from the file are reported by validate_data
+        '''
         try:
-            return pd.read_csv(self.filename)
+            header = pd.read_csv(self.filename, nrows=0).columns
         except FileNotFoundError:
             raise FileNotFoundError('File not found in the root directory')
+        columns = [column for column in column_list if column in header]
+        return {'usecols': columns, 'dtype': {column: csv_dtypes[column] for column in columns}}
 
+    @metrics.timed('read_csv')
+    def read_csv(self) -> pd.DataFrame:
+        # Read the CSV file
+        return self._read(self.filename, self._read_options())
+
+    def _read(self, source, options: Dict[str, Any]) -> pd.DataFrame:
+        data_frame = pd.read_csv(source, engine=self.engine, **options)
+        if self.engine == 'pyarrow':
+            # Unlike the C engine, pyarrow reads empty text fields as empty strings
+            for column in text_columns:
+                if column in data_frame:
+                    data_frame[column] = data_frame[column].mask(data_frame[column] == '')
+        return data_frame
+
+    @metrics.timed('validate_data')
     def validate_data(self, data_frame: pd.DataFrame) -> pd.DataFrame:
-        '''validate and clean the data (change NaN values to 0)'''
+        '''validate the data (missing values stay NA, they are written to DB as NULL)'''
         # Check if the data frame is empty
         if data_frame.empty:
             raise ValueError('The data frame is empty')
@@ -165,87 +284,500 @@ class DataParser:
             raise ValueError(
                 'The DataFrame does not contains the required columns')
 
-        return data_frame.fillna(sqlalchemy.sql.null())
+        return data_frame
+
+    @property
+    def data(self) -> pd.DataFrame:
+        '''Parsed and validated data, ordered by restaurant (built on first access)'''
+        if self._data is None:
+            self._build_index()
+        return self._data
+
+    def _build_index(self) -> None:
+        # Read and validate the file only once
+        self._index(self.validate_data(self.read_csv()))
+
+    @metrics.timed('index_restaurants')
+    def _index(self, data_frame: pd.DataFrame) -> None:
+        metrics.count('rows_read', len(data_frame))
+        # Positions of the rows of every restaurant (keys are sorted, rows keep the file order)
+        positions = data_frame.groupby('restaurant', observed=True).indices
+
+        # Reorder the rows once so that each restaurant is a contiguous block
+        # (rows without a restaurant are dropped, a frame of such rows only gives an empty frame)
+        order = np.concatenate(list(positions.values())) if positions else np.empty(0, dtype=np.intp)
+        self._data = data_frame.take(order)
+
+        self._restaurant_index = {}
+        start = 0
+        for restaurant_name, rows in positions.items():
+            self._restaurant_index[restaurant_name] = slice(start, start + len(rows))
+            start += len(rows)
+
+    def iter_chunks(self, chunksize: int | None = None) -> Iterator['DataParser']:
+        '''
+        Read the file in chunks of chunksize rows, every chunk is validated and indexed by restaurant
+        like a whole file, so only one chunk is kept in memory at a time.
+        Without chunksize the whole file is a single chunk (this parser).
+        Chunks are read with the C engine, pyarrow cannot read a file in chunks
+        '''
+        if not chunksize:
+            yield self
+            return
+
+        reader = pd.read_csv(self.filename, chunksize=chunksize, **self._read_options())
+        row_offset = 0
+
+        with reader:
+            while True:
+                with metrics.timer('read_csv'):
+                    data_frame = next(reader, None)
+                if data_frame is None:
+                    break
+                chunk = DataParser(self.filename, self.engine)
+                chunk.row_offset = row_offset
+                row_offset += len(data_frame)
+                chunk._index(self.validate_data(data_frame))
+                yield chunk
 
-    # ->  DataFrameGroupBy[Scalar]
     def group_by_restaurant(self) -> pd.DataFrame:
-        # Group the data by restaurant
-        grouped = self.validate_data(self.read_csv()).groupby('restaurant')
-        return grouped
+        # Group the (cached) data by restaurant
+        return self.data.groupby('restaurant', sort=False, observed=True)
 
     def get_restaurants_names(self) -> List[str]:
         # Get the names of restaurants
-        return self.group_by_restaurant().groups.keys()
+        if self._restaurant_index is None:
+            self._build_index()
+        return list(self._restaurant_index)
 
     def get_restaurant_data(self, restaurant_name: str) -> pd.DataFrame:
 
-        # Get the data for a specific restaurant
-        return self.group_by_restaurant().get_group(restaurant_name)
+        # Get the data for a specific restaurant (a slice of the cached frame, not a copy)
+        if self._restaurant_index is None:
+            self._build_index()
+        return self._data.iloc[self._restaurant_index[restaurant_name]]
 
+    def close(self) -> None:
+        # Nothing to release, the data is in memory
+        pass
 
-def load_restaurants_data_from_csv_to_db(filename: str):
-    # Create a data parser
-    data_parser = DataParser(filename)
 
-    # Get the names of restaurants
-    restaurants_names = data_parser.get_restaurants_names()
+class MappedDataParser(DataParser):
+    '''
+    Data parser reading a memory-mapped file (see mmap_reader.MappedCSV): the file is scanned once for
+    the byte ranges of every restaurant, then the rows of a restaurant are parsed when they are requested.
+    Only the rows of the restaurants being loaded are in memory, and restaurants parsed in different
+    threads read disjoint ranges of the file (the pandas parser releases the GIL)
+    '''
+    def __init__(self, filename: str, engine: str = 'c'):
+        super().__init__(filename, engine)
+        self._mapped: MappedCSV | None = None
+        self._options: Dict[str, Any] | None = None
+
+    @metrics.timed('index_restaurants')
+    def _build_index(self) -> None:
+        self._mapped = MappedCSV(self.filename, 'restaurant')
+        if not all(column in self._mapped.columns for column in column_list):
+            raise ValueError('The DataFrame does not contains the required columns')
+        self._options = self._read_options()
+        ranges = self._mapped.runs()
+
+        # Names read as missing values by pandas (NA, null...) are not restaurants, as with DataParser
+        quoted = ['"' + name.replace('"', '""') + '"' for name in ranges]
+        names = pd.read_csv(io.StringIO('\n'.join(['restaurant'] + quoted)), dtype=object)['restaurant']
+        names = sorted(name for name, missing in zip(ranges, names.isna()) if not missing)
+        if not names:
+            raise ValueError('The data frame is empty')
+        self._restaurant_index = {name: ranges[name] for name in names}
 
-    # Open a DB session
-    with DBSession() as session:
+    @property
+    def data(self) -> pd.DataFrame:
+        '''All the restaurants in one frame, ordered by restaurant (parsed on every access)'''
+        return pd.concat([self.get_restaurant_data(name) for name in self.get_restaurants_names()],
+                         ignore_index=True)
+
+    def iter_chunks(self, chunksize: int | None = None) -> Iterator['DataParser']:
+        '''A single chunk: only the rows of the restaurants being loaded are in memory, chunksize is not needed'''
+        yield self
+
+    def get_restaurant_data(self, restaurant_name: str) -> pd.DataFrame:
+        # Parse the rows of a restaurant (a copy of its byte ranges only)
+        if self._restaurant_index is None:
+            self._build_index()
+        with metrics.timer('read_csv'):
+            data_frame = self._read(self._mapped.read(self._restaurant_index[restaurant_name]), self._options)
+        metrics.count('rows_read', len(data_frame))
+        return data_frame
+
+    def close(self) -> None:
+        if self._mapped is not None:
+            self._mapped.close()
+
+
+def _create_parser(filename: str, csv_engine: str, reader: str) -> DataParser:
+    # Compressed files cannot be mapped, they are read by pandas
+    if reader == 'mmap' and not filename.lower().endswith(compressed_extensions):
+        return MappedDataParser(filename, csv_engine)
+    return DataParser(filename, csv_engine)
+
+
+def _write_restaurant_items(session, writer, restaurant_menu: RestaurantMenuHandler, restaurant_id: int,
+                            category_ids: Dict[str, int], subcategory_ids: Dict[str, int], skip_in_db: bool,
+                            existing_items: ExistingItems | None, item_hashes: ItemHashes | None,
+                            claimed: List[Tuple[int, pd.Series]] | None = None
+                            ) -> Tuple[Dict[str, int], pd.Series, pd.Series | None]:
+    '''
+    Write the items of a restaurant, return the numbers of inserted, updated and skipped rows
+    and the names (and content hashes) of the written items.
+    claimed: the new items are remembered as soon as they are found (indexes shared with other loaders)
+    and added to this list, to be released if the transaction is rolled back
+    '''
+    if item_hashes is not None:
+        # Incremental load: insert new rows, update the items whose content changed
+        items = restaurant_menu.get_unique_items()
+        hashes = restaurant_menu.get_content_hashes(items)
+        split = item_hashes.claim if claimed is not None else item_hashes.split
+        new, changed, changed_ids = split(restaurant_id, items['item'], hashes)
+        if claimed is not None:
+            claimed.append((restaurant_id, items['item'][new]))
+
+        new_records = restaurant_menu.build_item_records(items[new], restaurant_id, category_ids, subcategory_ids,
+                                                         hashes[new])
+        changed_records = restaurant_menu.build_item_records(items[changed], restaurant_id, category_ids,
+                                                             subcategory_ids, hashes[changed])
+        with metrics.timer('write_items'):
+            inserted = writer.write(new_records)
+        with metrics.timer('update_items'):
+            updated = writer.update(changed_records, changed_ids)
+        counts = {'inserted': inserted, 'updated': updated,
+                  'skipped': len(restaurant_menu.data) - inserted - updated}
+        if inserted or updated:
+            with metrics.timer('refresh_stats'):
+                refresh_nutrition_stats(session, [restaurant_id])
+        return counts, items['item'][new | changed], hashes[new | changed]
+
+    # Drop the items already in DB unless the writer skips them itself (copy mode, ON CONFLICT inserts)
+    if skip_in_db:
+        items = restaurant_menu.get_unique_items()
+    elif existing_items is not None:
+        filter_new = existing_items.claim_new if claimed is not None else existing_items.filter_new
+        items = filter_new(restaurant_id, restaurant_menu.get_unique_items())
+        if claimed is not None:
+            claimed.append((restaurant_id, items['item']))
+    else:
+        items = restaurant_menu.get_nonexisted_items(session)
+
+    # Write non-existed items in DB together with their subcategories
+    records = restaurant_menu.build_item_records(items, restaurant_id, category_ids, subcategory_ids)
+    with metrics.timer('write_items'):
+        written = writer.write(records)
+
+    # The copy writer only stages the items, they are counted after the merge
+    inserted = 0 if isinstance(writer, CopyItemWriter) else written
+    counts = {'inserted': inserted, 'updated': 0, 'skipped': len(restaurant_menu.data) - written}
+    if inserted:
+        with metrics.timer('refresh_stats'):
+            refresh_nutrition_stats(session, [restaurant_id])
+    return counts, items['item'], None
+
+
+def _remember_items(existing_items: ExistingItems | None, item_hashes: ItemHashes | None, restaurant_id: int,
+                    names: pd.Series, hashes: pd.Series | None) -> None:
+    # Written items are existing items for the next restaurants and chunks
+    if existing_items is not None:
+        existing_items.add(restaurant_id, names)
+    if item_hashes is not None:
+        item_hashes.add(restaurant_id, names, hashes)
+
+
+def _release_claims(existing_items: ExistingItems | None, item_hashes: ItemHashes | None,
+                    claimed: List[Tuple[int, pd.Series]] | None) -> None:
+    # The claimed items were rolled back, the other loaders sharing the indexes must write them
+    for restaurant_id, names in claimed or ():
+        if existing_items is not None:
+            existing_items.release(restaurant_id, names)
+        if item_hashes is not None:
+            item_hashes.release(restaurant_id, names)
+
+
+def _record(stats: Dict[str, Any], worker: str, restaurants: int, counts: Dict[str, int], seconds: float) -> None:
+    # Add the numbers of a worker to the load statistics (only updated from the main thread)
+    worker_stats = stats['workers'].setdefault(
+        worker, {'restaurants': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'seconds': 0.0})
+    worker_stats['restaurants'] += restaurants
+    worker_stats['seconds'] += seconds
+    for name, count in counts.items():
+        worker_stats[name] += count
+        stats[name] += count
+        metrics.count(f'rows_{name}', count)
+
+
+def _create_categorizer(rules_file: str | None, match_cache_file: str | None) -> FoodCategorizer:
+    # The shared categorizer unless other rules or a persistent match cache are asked for
+    if not rules_file and not match_cache_file:
+        return food_categorizer
+    rules = load_rules(rules_file) if rules_file else (category_rules, subcategory_rules)
+    return FoodCategorizer(*rules, match_cache=MatchCache(rules_hash(*rules), file_name=match_cache_file))
+
+
+def _match_cache_stats(categorizer: FoodCategorizer, cache_hits: int, cache_misses: int) -> Dict[str, Any]:
+    '''Save the match cache, return its hits and misses since the given numbers'''
+    categorizer.match_cache.save()
+    match_cache = categorizer.match_cache.stats()
+    hits, misses = match_cache['hits'] - cache_hits, match_cache['misses'] - cache_misses
+    metrics.count('match_cache_lookups', hits, label='hit')
+    metrics.count('match_cache_lookups', misses, label='miss')
+    return {'hits': hits, 'misses': misses, 'size': match_cache['size'],
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+
+
+def _create_writer(session, mode: str, batch_size: int, dedup: str):
+    if mode == 'copy':
+        return CopyItemWriter(session, batch_size)
+    elif mode == 'row':
+        return RowItemWriter(session)
+    return BulkItemWriter(session, batch_size, skip_existing=dedup == 'db')
+
+
+@metrics.timed('load')
+def load_restaurants_data_from_csv_to_db(filename: str, mode: str = 'bulk', batch_size: int = DEFAULT_BATCH_SIZE,
+                                         chunksize: int | None = None, dedup: str = 'preload',
+                                         workers: int = 1, incremental: bool = False,
+                                         rules_file: str | None = None,
+                                         match_cache_file: str | None = None,
+                                         csv_engine: str = 'c', skip_loaded_files: bool = False,
+                                         caches: LoadCaches | None = None, reader: str = 'pandas',
+                                         commit_rows: int | None = None, commit_bytes: int | None = None,
+                                         resume: bool = False) -> Dict[str, Any]:
+    '''
+    Load food items from CSV to DB.
+    mode: 'bulk' writes items in batches of batch_size rows, 'row' writes them one by one through the ORM,
+    'copy' streams all rows into a staging table (COPY on PostgreSQL) and merges them with set-based SQL
+    chunksize: read the file in chunks of this many rows, each chunk is written before the next one is read.
+    Rows of a restaurant may be spread over several chunks
+    dedup: how items already in DB are skipped, see load_options.dedup_modes
+    (the copy mode always deduplicates during its merge)
+    workers: number of threads loading restaurants in parallel, each with its own session and transaction.
+    A failed restaurant is rolled back and reported without stopping the others
+    incremental: skip the file if the same content was already loaded (see LoadManifest), otherwise
+    compare the content hash of every row with DB: new rows are inserted, changed rows update their item
+    (bulk mode only, replaces dedup)
+    rules_file: categorize with the rules of this JSON/YAML file (see rules.load_rules)
+    instead of category_rules and subcategory_rules
+    match_cache_file: SQLite file keeping the keyword matches of item names between runs
+    (see categorization.MatchCache), emptied when the rules change
+    csv_engine: pandas CSV engine, 'c' or 'pyarrow' (see load_options.csv_engines), chunks are always read with 'c'
+    skip_loaded_files: skip the file if the same content was already loaded and record it in LoadManifest
+    once fully loaded, as the incremental load does
+    caches: entity ids, existing items and categorizer shared with the loads of other files (see LoadCaches),
+    rules_file and match_cache_file are then ignored
+    reader: 'pandas' reads the whole file at once, 'mmap' maps it in memory and parses the rows of a restaurant
+    when it is loaded (see MappedDataParser and load_options.csv_readers): the workers parse their restaurants
+    in parallel and the memory stays bounded without chunksize. Compressed files are read by pandas
+    commit_rows, commit_bytes: commit the restaurants of a serial load (one worker, bulk or row mode) in
+    transactions of at least this many rows or bytes of parsed rows instead of one per restaurant (see CommitBatch)
+    resume: continue after the last restaurant committed by an interrupted load of the same file.
+    Only loads with commit_rows, commit_bytes or resume record their progress: every commit stores it
+    in load_checkpoints (see checkpoints.py) and the checkpoint is removed once the file is fully loaded.
+    The load must read the file in the same chunks (chunksize)
+
+    Returns the load statistics: numbers of inserted, updated and skipped rows, the same numbers with
+    restaurants and seconds per worker, the errors of failed restaurants and the hits and misses
+    of the match cache during the load (already_loaded instead for a skipped file).
+    A resumed load also returns the checkpoint it started from (resumed)
+    '''
+    if mode not in load_modes:
+        raise ValueError(f'Unknown load mode: {mode}')
+    if dedup not in dedup_modes:
+        raise ValueError(f'Unknown deduplication mode: {dedup}')
+    if dedup == 'db' and mode == 'row':
+        raise ValueError('Deduplication in DB requires the bulk or copy mode')
+    if workers < 1:
+        raise ValueError('The number of workers must be a positive number')
+    if workers > 1 and mode == 'copy':
+        raise ValueError('The copy mode merges all rows in one transaction and cannot use workers')
+    if incremental and mode != 'bulk':
+        raise ValueError('The incremental load requires the bulk mode')
+    if csv_engine not in csv_engines:
+        raise ValueError(f'Unknown CSV engine: {csv_engine}')
+    if reader not in csv_readers:
+        raise ValueError(f'Unknown CSV reader: {reader}')
+    if any(limit is not None and limit < 1 for limit in (commit_rows, commit_bytes)):
+        raise ValueError('The commit batch size must be a positive number')
+    serial = workers == 1 and mode != 'copy'
+    if not serial and (commit_rows is not None or commit_bytes is not None or resume):
+        raise ValueError('Commit batching and resuming require a single worker and the bulk or row mode')
+    # The file is hashed and its progress recorded only when a load can be resumed
+    checkpointed = resume or commit_rows is not None or commit_bytes is not None
+
+    skip_in_db = not incremental and (mode == 'copy' or dedup == 'db')
+    stats: Dict[str, Any] = {'inserted': 0, 'updated': 0, 'skipped': 0, 'workers': {}, 'failed': {}}
+
+    # Create a data parser
+    data_parser = _create_parser(filename, csv_engine, reader)
+    categorizer = caches.categorizer if caches is not None else _create_categorizer(rules_file, match_cache_file)
+    cache_hits, cache_misses = categorizer.match_cache.hits, categorizer.match_cache.misses
+
+    # Open a DB session. The copy mode stages the rows in temporary tables, which only exist on the connection
+    # that created them: all the transactions of its session run on one connection
+    with (get_engine().connect() if mode == 'copy' else nullcontext()) as connection, \
+            DBSession(sessionmaker(bind=connection) if connection is not None else None) as session:
+
+        # Skip a file whose content was already loaded
+        content_hash = file_hash(filename) if incremental or skip_loaded_files or checkpointed else None
+        if incremental or skip_loaded_files:
+            manifest = is_file_loaded(session, content_hash)
+            if manifest is not None:
+                stats['skipped'] = manifest.rows
+                stats['already_loaded'] = True
+                return stats
+
+        # Restaurants of the chunk starting at row_offset are skipped up to the checkpoint one,
+        # the earlier chunks are skipped entirely
+        chunk_rows = None if isinstance(data_parser, MappedDataParser) else chunksize or None
+        checkpoint = get_checkpoint(session, content_hash) if resume else None
+        if checkpoint is not None:
+            if checkpoint.chunksize != chunk_rows:
+                raise ValueError(f'{filename} was partially loaded in chunks of {checkpoint.chunksize or "all"} rows, '
+                                 f'resume it with the same chunksize and reader')
+            # Plain values: the checkpoint object is expired and detached by the commits
+            stats['resumed'] = {'row_offset': checkpoint.row_offset, 'restaurant': checkpoint.restaurant,
+                                'rows': checkpoint.rows}
+        resumed = stats.get('resumed')
 
         # Create a DB entity handler and get or create the entities (restaurants, categories, subcategories)
-        handler = EntityHandler(session)
-
-        restaurant_entities = handler.get_or_create_entities(
-            restaurants_names, 'Restaurant')
-        category_entities = handler.get_or_create_entities(
-            categories_list, 'Category')
-        subcategory_entities = handler.get_or_create_entities(
-            subcategories_list, 'SubCategory')
-
-        # Iterate over the restaurants names
-        for restaurant_name in restaurants_names:
-
-            restaurant_menu = RestaurantMenuHandler(
-                restaurant_name, data_parser.get_restaurant_data(restaurant_name))
-
-    # Iterate over non-existed items in DB
-            for _, item_row in restaurant_menu.get_nonexisted_items(session).iterrows():
-
-                # Get the category and subcategories of the food item
-                category, subcategories = restaurant_menu.attach_category_and_subcategories(
-                    item_row, category_entities, subcategory_entities)
-                # Create a new food item and add it to the session
-                food_item = FoodItem(
-                    name=item_row['item'],
-                    calories=item_row['calories'],
-                    cal_fat=item_row['cal_fat'],
-                    total_fat=item_row['total_fat'],
-                    sat_fat=item_row['sat_fat'],
-                    trans_fat=item_row['trans_fat'],
-                    cholesterol=item_row['cholesterol'],
-                    sodium=item_row['sodium'],
-                    total_carb=item_row['total_carb'],
-                    fiber=item_row['fiber'],
-                    sugar=item_row['sugar'],
-                    protein=item_row['protein'],
-                    vit_a=item_row['vit_a'],
-                    vit_c=item_row['vit_c'],
-                    calcium=item_row['calcium'],
-                    salad=item_row['salad'],
-                    restaurant_id=restaurant_entities[restaurant_name].id,
-                    category_id=category.id,
-                )
-                session.add(food_item)
-
-                session.flush()
-
-                # Add the food item to the corresponding subcategories
-                for subcategory in subcategories:
-                    food_item_subcategory = FoodItemSubcategory(
-                        food_item_id=food_item.id, subcategory_id=subcategory.id)
-                    session.add(food_item_subcategory)
-
-                session.flush()
-
-            session.commit()
+        handler = EntityHandler(session, caches.dimensions if caches is not None else None)
+
+        restaurant_ids: Dict[str, int] = {}
+        category_ids = handler.get_or_create_entities(categories_list, 'Category')
+        subcategory_ids = handler.get_or_create_entities(categorizer.subcategories, 'SubCategory')
+        session.commit()
+
+        writer = _create_writer(session, mode, batch_size, dedup) if workers == 1 else None
+
+        # Load names (or content hashes) of all the existing items at once
+        item_hashes = existing_items = None
+        if incremental:
+            item_hashes = caches.item_hashes(session) if caches is not None else ItemHashes(session)
+        elif dedup == 'preload' and not skip_in_db:
+            existing_items = caches.existing_items(session) if caches is not None else ExistingItems(session)
+        claim = caches is not None
+
+        batch = CommitBatch(session, commit_rows, commit_bytes, content_hash if checkpointed else None, filename,
+                            chunk_rows, resumed['rows'] if resumed else 0) if serial else None
+
+        # Sessions of the workers come from an engine with one pooled connection per worker
+        worker_engine = create_pooled_engine(workers) if workers > 1 else None
+        worker_sessions = sessionmaker(bind=worker_engine) if worker_engine is not None else None
+
+        def load_restaurant(chunk: DataParser, restaurant_name: str):
+            start_time = time.perf_counter()
+            counts, error = {}, None
+            # Parsed in the worker: with MappedDataParser the workers parse their restaurants in parallel
+            restaurant_menu = RestaurantMenuHandler(restaurant_name, chunk.get_restaurant_data(restaurant_name),
+                                                    categorizer)
+            worker_claims = [] if claim else None
+            with DBSession(worker_sessions) as worker_session:
+                try:
+                    restaurant_id = restaurant_ids[restaurant_menu.name]
+                    counts, names, hashes = _write_restaurant_items(
+                        worker_session, _create_writer(worker_session, mode, batch_size, dedup), restaurant_menu,
+                        restaurant_id, category_ids, subcategory_ids, skip_in_db, existing_items, item_hashes,
+                        worker_claims)
+                    with metrics.timer('commit'):
+                        worker_session.commit()
+                    _remember_items(existing_items, item_hashes, restaurant_id, names, hashes)
+                except Exception as exception:
+                    worker_session.rollback()
+                    _release_claims(existing_items, item_hashes, worker_claims)
+                    error = repr(exception)
+            return threading.current_thread().name, counts, time.perf_counter() - start_time, error
+
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='loader') if workers > 1 else None
+        # Items claimed by the main thread and not committed yet (the copy mode claims nothing)
+        claimed = batch.claimed if batch is not None else []
+        try:
+            for chunk in data_parser.iter_chunks(chunksize):
+                if resumed and chunk.row_offset < resumed['row_offset']:
+                    continue
+
+                # Get the names of restaurants and create the ones seen for the first time
+                restaurants_names = chunk.get_restaurants_names()
+                if resumed and chunk.row_offset == resumed['row_offset'] and resumed['restaurant'] in restaurants_names:
+                    restaurants_names = restaurants_names[restaurants_names.index(resumed['restaurant']) + 1:]
+                new_restaurants = [name for name in restaurants_names if name not in restaurant_ids]
+                if new_restaurants:
+                    if caches is not None and session.get_bind().dialect.name == 'sqlite':
+                        # SQLite has a single writer: the restaurants written so far (with their checkpoint) are
+                        # committed before the shared entities are created on another connection
+                        if batch is not None:
+                            batch.commit()
+                        else:
+                            session.commit()
+                    restaurant_ids.update(handler.get_or_create_entities(new_restaurants, 'Restaurant'))
+                    # Workers use their own connections, they only see committed restaurants
+                    if pool is not None:
+                        session.commit()
+
+                if pool is not None:
+                    # Wait for the whole chunk, so the rows of a restaurant spread over chunks are loaded in order
+                    for restaurant_name, (worker, counts, seconds, error) in zip(
+                            restaurants_names, pool.map(partial(load_restaurant, chunk), restaurants_names)):
+                        _record(stats, worker, 1, counts, seconds)
+                        if error is not None:
+                            stats['failed'][restaurant_name] = error
+                    continue
+
+                # Iterate over the restaurants
+                for restaurant_name in restaurants_names:
+                    start_time = time.perf_counter()
+                    restaurant_menu = RestaurantMenuHandler(restaurant_name, chunk.get_restaurant_data(restaurant_name),
+                                                            categorizer)
+                    restaurant_id = restaurant_ids[restaurant_menu.name]
+                    counts, names, hashes = _write_restaurant_items(
+                        session, writer, restaurant_menu, restaurant_id, category_ids, subcategory_ids,
+                        skip_in_db, existing_items, item_hashes, claimed if claim else None)
+
+                    # The next restaurants of the batch see these items in the transaction
+                    _remember_items(existing_items, item_hashes, restaurant_id, names, hashes)
+                    if batch is not None:
+                        batch.add(chunk.row_offset, restaurant_menu)
+                    _record(stats, 'main', 1, counts, time.perf_counter() - start_time)
+
+            if batch is not None:
+                batch.commit()
+        except Exception:
+            # The file fails: its uncommitted restaurants are rolled back when the session is closed
+            _release_claims(existing_items, item_hashes, claimed)
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+                worker_engine.dispose()
+            data_parser.close()
+
+        if mode == 'copy':
+            start_time = time.perf_counter()
+            with metrics.timer('merge_items'):
+                inserted = writer.merge()
+            if inserted:
+                with metrics.timer('refresh_stats'):
+                    refresh_nutrition_stats(session, restaurant_ids.values())
+            _record(stats, 'main', 0, {'inserted': inserted, 'skipped': writer.row_no - inserted},
+                    time.perf_counter() - start_time)
+            with metrics.timer('commit'):
+                session.commit()
+
+        # Remember the fully loaded file, so that it is skipped next time
+        if (incremental or skip_loaded_files) and not stats['failed']:
+            session.add(LoadManifest(file_hash=content_hash, file_name=filename,
+                                     rows=stats['inserted'] + stats['updated'] + stats['skipped'] +
+                                     (resumed['rows'] if resumed else 0)))
+        if checkpointed:
+            clear_checkpoint(session, content_hash)
+        session.commit()
+
+    # The match cache of shared caches is reported once for all files
+    if caches is None:
+        stats['match_cache'] = _match_cache_stats(categorizer, cache_hits, cache_misses)
+    return stats
@@ -1,8 +1,13 @@
-from sqlalchemy import desc, func
-import matplotlib.pyplot as plt
+import csv
+import gzip
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 import pandas as pd
 
-from models import Restaurant, Category, FoodItem, SubCategory, FoodItemSubcategory
+from models import Restaurant, Category, FoodItem, SubCategory, FoodItemSubcategory, RestaurantNutritionStats
+from metrics import metrics
 from session import DBSession
 
 
@@ -15,16 +20,21 @@ class DataVizualizer:
         pass
 
     def query(self, session):
-        # Get data from  DB
+        # Get the statistics precomputed by the loader (one row per restaurant)
         return session.query(
             Restaurant.name,
-            func.avg(FoodItem.calories).label('avg_calories'),
-            func.min(FoodItem.calories).label('min_calories'),
-            func.max(FoodItem.calories).label('max_calories'),
-            func.avg(FoodItem.total_carb).label('avg_carbs')
-        ).join(FoodItem).group_by(Restaurant.name).order_by('avg_carbs').limit(5).all()
+            RestaurantNutritionStats.avg_calories.label('avg_calories'),
+            RestaurantNutritionStats.min_calories.label('min_calories'),
+            RestaurantNutritionStats.max_calories.label('max_calories'),
+            RestaurantNutritionStats.avg_carbs.label('avg_carbs')
+        ).join(RestaurantNutritionStats).order_by('avg_carbs').limit(5).all()
 
-    def visualize_data(self, query):
+    def visualize_data(self, query, output_file: str | None = None):
+        '''
+        Print and plot the statistics: on screen, or into output_file (PNG, SVG... by its extension)
+        through the Agg backend, which needs no display and can run in a background thread.
+        matplotlib is only imported here
+        '''
         df = pd.DataFrame(query, columns=[
                           'Restaurant', 'Average Calories', 'Min Calories', 'Max Calories', 'Average Carbs'])
         df['Average Calories'] = pd.to_numeric(
@@ -33,12 +43,50 @@ class DataVizualizer:
             df['Average Carbs'], errors='coerce')
         print(df)
 
+        if output_file is None:
+            import matplotlib.pyplot as plt
+
+            _, axes = plt.subplots()
+            self.plot(df, axes)
+            plt.show()
+            return
+
+        # A standalone figure does not touch the global pyplot state (not thread-safe)
+        from matplotlib.figure import Figure
+
+        figure = Figure()
+        self.plot(df, figure.subplots())
+        figure.savefig(output_file, bbox_inches='tight')
+
+    def plot(self, df: pd.DataFrame, axes) -> None:
         # Visualize the data
-        df.plot(x='Restaurant', kind='bar')
-        plt.title('Top 5 restaurants  that have the least amount of carbs')
-        plt.ylabel('Carbs')
-        plt.xlabel('Restaurant')
-        plt.show()
+        df.plot(x='Restaurant', kind='bar', ax=axes)
+        axes.set_title('Top 5 restaurants  that have the least amount of carbs')
+        axes.set_ylabel('Carbs')
+        axes.set_xlabel('Restaurant')
+
+
+# Columnar export formats by file extension
+columnar_formats: Dict[str, str] = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+# Low-cardinality columns stored dictionary-encoded in columnar exports
+dictionary_columns: List[str] = ['restaurant', 'salad', 'category']
+
+
+class DictionaryEncoder:
+    '''
+    Dictionary-encodes a column across record batches: the dictionary only grows,
+    so every batch extends the dictionary of the previous ones (written as a delta)
+    '''
+
+    def __init__(self) -> None:
+        self.values: Dict[str, int] = {}
+
+    def encode(self, values: List[str | None]):
+        import pyarrow as pa
+
+        indices = [None if value is None else self.values.setdefault(value, len(self.values)) for value in values]
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(list(self.values), pa.string()))
 
 
 class DataExporter:
@@ -49,12 +97,124 @@ class DataExporter:
     def __init__(self) -> None:
         pass
 
-    def export_data(self, query, file_name: str = 'food_cats.csv'):
+    def export_data(self, query, file_name: str = 'food_cats.csv', stream: bool = False,
+                    batch_size: int = 10000) -> int:
+        '''
+        Export the query result to CSV (gzip-compressed if the file name ends with .gz), return the number of rows.
+        stream: write the rows in batches of batch_size read from a server-side cursor instead of
+        loading the whole result, on PostgreSQL the rows are copied with COPY (SELECT ...) TO STDOUT
+        '''
+        if stream:
+            with self._open(file_name) as output:
+                if query.session.get_bind().dialect.name == 'postgresql':
+                    return self._copy(query, output)
+                return self._write_batches(query, output, batch_size)
+
         # Convert the query result to a DataFrame
         df = pd.read_sql(query.statement, query.session.bind)
 
         # Export the DataFrame to CSV
         df.to_csv(file_name, index=False)
+        return len(df)
+
+    def export_columnar(self, query, file_name: str, batch_size: int = 10000) -> int:
+        '''
+        Export the result of DataProcessor.query_items to Parquet or Arrow IPC (chosen by the file extension),
+        return the number of items.
+        Every item is one row with its subcategories in the subcategories list column, restaurant, salad and
+        category are dictionary-encoded, and the rows are streamed in row groups (record batches) of batch_size items
+        '''
+        import pyarrow as pa
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        file_format = columnar_formats.get(os.path.splitext(file_name)[1])
+        if file_format is None:
+            raise ValueError(f'Unknown columnar format of {file_name}, use one of: {", ".join(columnar_formats)}')
+
+        result = query.session.execute(
+            query.statement, execution_options={'stream_results': True, 'yield_per': batch_size})
+        keys = list(result.keys())
+        columns = [key for key in keys if key not in ('food_item_id', 'subcategory')]
+        positions = [keys.index(column) for column in columns]
+        item_position, subcategory_position = keys.index('food_item_id'), keys.index('subcategory')
+
+        # Arrow types of the exported columns
+        python_types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+        selected = query.statement.selected_columns
+        fields = [pa.field(column, pa.dictionary(pa.int32(), pa.string()) if column in dictionary_columns
+                           else python_types[selected[column].type.python_type]) for column in columns]
+        schema = pa.schema([*fields, pa.field('subcategories', pa.list_(pa.string()))])
+        encoders = {column: DictionaryEncoder() for column in columns if column in dictionary_columns}
+
+        if file_format == 'parquet':
+            writer = pa.parquet.ParquetWriter(file_name, schema, use_dictionary=dictionary_columns)
+        else:
+            writer = pa.ipc.new_file(file_name, schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+        def write(items: List[List]) -> None:
+            arrays = [encoders[column].encode([item[position] for item in items]) if column in encoders
+                      else pa.array([item[position] for item in items], field.type)
+                      for position, (column, field) in enumerate(zip(columns, fields))]
+            arrays.append(pa.array([item[-1] for item in items], pa.list_(pa.string())))
+            batch = pa.record_batch(arrays, schema=schema)
+            if file_format == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+
+        total = 0
+        items: List[List] = []
+        last_item_id = None
+        with writer:
+            for batch in result.partitions():
+                for row in batch:
+                    # The rows of an item are adjacent, start a new item on a new id
+                    if row[item_position] != last_item_id:
+                        if len(items) >= batch_size:
+                            write(items)
+                            total += len(items)
+                            items = []
+                        items.append([row[position] for position in positions] + [[]])
+                        last_item_id = row[item_position]
+                    if row[subcategory_position] is not None:
+                        items[-1][-1].append(row[subcategory_position])
+            if items or not total:
+                write(items)
+                total += len(items)
+        return total
+
+    @staticmethod
+    def _open(file_name: str):
+        if file_name.endswith('.gz'):
+            return gzip.open(file_name, 'wt', newline='')
+        return open(file_name, 'w', newline='')
+
+    @staticmethod
+    def _write_batches(query, output, batch_size: int) -> int:
+        result = query.session.execute(
+            query.statement, execution_options={'stream_results': True, 'yield_per': batch_size})
+
+        # Same layout as DataFrame.to_csv
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(result.keys())
+        rows = 0
+        for batch in result.partitions():
+            writer.writerows(batch)
+            rows += len(batch)
+        return rows
+
+    @staticmethod
+    def _copy(query, output) -> int:
+        session = query.session
+        sql = query.statement.compile(session.get_bind(), compile_kwargs={'literal_binds': True})
+
+        cursor = session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)', output)
+            return cursor.rowcount
+        finally:
+            cursor.close()
 
 
 class DataProcessor:
@@ -99,20 +259,79 @@ class DataProcessor:
             SubCategory, FoodItemSubcategory.subcategory_id == SubCategory.id).order_by('restaurant')
         return query
 
+    def query_items(self, session, columns: List[str] | None = None):
+        '''
+        The data of query() ordered by restaurant and item, so the rows of an item (one per subcategory)
+        are adjacent, with the item id in the food_item_id column.
+        columns: only select these columns (subcategory is always selected)
+        '''
+        query = self.query(session)
+        selected = query.statement.selected_columns
+        if columns:
+            unknown = set(columns) - set(selected.keys())
+            if unknown:
+                raise ValueError(f'Unknown columns: {", ".join(sorted(unknown))}')
+            query = query.with_entities(
+                *[selected[column] for column in selected.keys() if column in columns and column != 'subcategory'],
+                selected['subcategory'])
+        return query.add_columns(FoodItem.id.label('food_item_id')).order_by(None).order_by(Restaurant.name, FoodItem.id)
+
 
-def calculate_rank_and_upload():
-    # Get the data
-    data_vizualizer = DataVizualizer()
+@metrics.timed('export')
+def export_items(session, file_name: str = 'food_cats.csv', stream: bool = False,
+                 columns: List[str] | None = None) -> int:
+    '''Export the items to a CSV, Parquet or Arrow file (by its extension), return the number of rows'''
     data_exporter = DataExporter()
     data_processor = DataProcessor()
 
+    start_time = time.perf_counter()
+    # Parquet and Arrow files store one row per item, CSV one row per item and subcategory
+    if os.path.splitext(file_name)[1] in columnar_formats:
+        rows = data_exporter.export_columnar(data_processor.query_items(session, columns), file_name)
+    else:
+        if columns:
+            raise ValueError('Column projection is only supported by the Parquet and Arrow exports')
+        rows = data_exporter.export_data(data_processor.query(session), file_name, stream)
+    elapsed_time = time.perf_counter() - start_time
+    print(f"DataExport: {rows} rows in {elapsed_time:.3f} seconds ({rows / elapsed_time:.0f} rows/s)")
+    metrics.count('rows_exported', rows)
+    return rows
+
+
+def plot_statistics(plot_file: str | None = None):
+    # Show the plot, or render it into plot_file
+    data_vizualizer = DataVizualizer()
+    with DBSession() as session:
+        data_vizualizer.visualize_data(data_vizualizer.query(session), plot_file)
+
+
+def calculate_rank_and_upload(file_name: str = 'food_cats.csv', stream: bool = False,
+                              columns: List[str] | None = None, plot_file: str | None = None):
+    '''
+    Visualize the statistics and export the items.
+    plot_file: render the plot into this file (headless) concurrently with the export,
+    instead of showing it before the export starts
+    '''
+    # Get the data
+    data_vizualizer = DataVizualizer()
+
     with DBSession() as session:
         query_vizualization = data_vizualizer.query(session)
 
-        query_processor = data_processor.query(session)
+        # The statistics are fetched above, the rendering thread does not use the session
+        render = None
+        if plot_file is None:
+            data_vizualizer.visualize_data(query_vizualization)
+        else:
+            render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plot')
+            render = render_pool.submit(data_vizualizer.visualize_data, query_vizualization, plot_file)
+            render_pool.shutdown(wait=False)
+
+        export_items(session, file_name, stream, columns)
 
-    data_vizualizer.visualize_data(query_vizualization)
-    data_exporter.export_data(query_processor)
+        # Wait for the plot, rendering errors are raised here
+        if render is not None:
+            render.result()
 
 
 if __name__ == "__main__":
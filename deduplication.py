@@ -0,0 +1,54 @@
+import threading
+from typing import Dict, Iterable, Set
+import pandas as pd
+from sqlalchemy import select
+from models import FoodItem
+from metrics import metrics
+
+
+class ExistingItems:
+    '''
+    In-memory index of the food items already in DB: restaurant id -> set of item names.
+    Loaded with a single streamed query instead of one query per restaurant
+    '''
+    @metrics.timed('dedup_preload')
+    def __init__(self, session, yield_per: int = 10000) -> None:
+        self.names: Dict[int, Set[str]] = {}
+        self._lock = threading.RLock()
+
+        rows = session.execute(
+            select(FoodItem.restaurant_id, FoodItem.name).execution_options(yield_per=yield_per))
+        for restaurant_id, name in rows:
+            self.names.setdefault(restaurant_id, set()).add(name)
+
+    def __contains__(self, key) -> bool:
+        restaurant_id, name = key
+        return name in self.names.get(restaurant_id, ())
+
+    def add(self, restaurant_id: int, names: Iterable[str]) -> None:
+        # Remember the items written during the load
+        with self._lock:
+            self.names.setdefault(restaurant_id, set()).update(names)
+
+    @metrics.timed('dedup_filter')
+    def filter_new(self, restaurant_id: int, items: pd.DataFrame) -> pd.DataFrame:
+        '''Return the items which are not in DB yet'''
+        # Locked: the names of a restaurant may be added by another thread meanwhile
+        with self._lock:
+            existing = self.names.get(restaurant_id)
+            return items[~items['item'].isin(existing)] if existing else items
+
+    def claim_new(self, restaurant_id: int, items: pd.DataFrame) -> pd.DataFrame:
+        '''
+        Return the items which are not in DB yet and remember them at once: when loaders share this index,
+        every item is written by the first one which claims it
+        '''
+        with self._lock:
+            new_items = self.filter_new(restaurant_id, items)
+            self.add(restaurant_id, new_items['item'])
+        return new_items
+
+    def release(self, restaurant_id: int, names: Iterable[str]) -> None:
+        # Forget claimed items which were rolled back, another loader may write them
+        with self._lock:
+            self.names.get(restaurant_id, set()).difference_update(names)
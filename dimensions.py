@@ -0,0 +1,61 @@
+import threading
+from typing import Dict, Iterable
+from sqlalchemy import insert, select
+
+
+class DimensionCache:
+    '''
+    name -> id of a dimension table (restaurants, categories, sub_categories), loaded once with a query
+    of these two columns only and shared by the loader and its workers.
+    Missing names are created in bulk with INSERT ... ON CONFLICT (name) DO NOTHING RETURNING
+    (PostgreSQL, SQLite): rows created meanwhile by a concurrent loader are not duplicated, their ids are read back
+    '''
+    __slots__ = ('model', 'ids', '_lock')
+
+    def __init__(self, model) -> None:
+        self.model = model
+        self.ids: Dict[str, int] | None = None
+        self._lock = threading.Lock()
+
+    def load(self, session) -> None:
+        table = self.model.__table__
+        self.ids = dict(session.execute(select(table.c.name, table.c.id)).all())
+
+    def get_or_create(self, session, names: Iterable[str], commit: bool = False) -> Dict[str, int]:
+        '''
+        Ids of the given names, the missing entities are created in the session transaction.
+        commit: commit the session before the new ids are shared, for caches shared by loaders
+        using other connections (they only see committed rows)
+        '''
+        names = list(dict.fromkeys(names))
+        with self._lock:
+            if self.ids is None:
+                self.load(session)
+            missing = [name for name in names if name not in self.ids]
+            if missing:
+                created = self._create(session, missing)
+                if commit:
+                    session.commit()
+                self.ids.update(created)
+            return {name: self.ids[name] for name in names}
+
+    def _create(self, session, names: list) -> Dict[str, int]:
+        table = self.model.__table__
+        dialect = session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            statement = dialect_insert(table).on_conflict_do_nothing(index_elements=['name'])
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            statement = dialect_insert(table).on_conflict_do_nothing(index_elements=['name'])
+        else:
+            statement = insert(table)
+
+        # Only the inserted rows are returned
+        created = dict(session.execute(statement.returning(table.c.name, table.c.id), [{'name': name} for name in names]).all())
+
+        # The other ones were inserted by a concurrent loader
+        conflicting = [name for name in names if name not in created]
+        if conflicting:
+            created.update(session.execute(select(table.c.name, table.c.id).where(table.c.name.in_(conflicting))).all())
+        return created
@@ -0,0 +1,116 @@
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+from data_loader import LoadCaches, _create_categorizer, _match_cache_stats, load_restaurants_data_from_csv_to_db
+from incremental import file_hash
+from metrics import metrics
+
+# Files picked from the directories given to the loader: plain or compressed CSV
+# (the compression is inferred by pandas from the extension, zstd requires the zstandard package)
+csv_extensions = ('.csv', '.csv.gz', '.csv.bz2', '.csv.zst')
+
+
+def expand_paths(patterns: List[str]) -> List[str]:
+    '''
+    Files matching the given paths: directories are searched recursively for CSV files (csv_extensions),
+    glob patterns (*, ?, [...], ** for subdirectories) are expanded, other paths are kept as is.
+    Every file is listed once, in the order of the patterns
+    '''
+    paths: Dict[str, None] = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for directory, _, file_names in sorted(os.walk(pattern)):
+                paths.update((os.path.join(directory, file_name), None) for file_name in sorted(file_names)
+                             if file_name.lower().endswith(csv_extensions))
+        elif glob.has_magic(pattern):
+            paths.update((path, None) for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path))
+        else:
+            paths[pattern] = None
+    return list(paths)
+
+
+def _content_hash(path: str) -> str | None:
+    try:
+        return file_hash(path)
+    except FileNotFoundError:
+        return None
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def load_files(paths: List[str], file_workers: int = 1, rules_file: str | None = None,
+               match_cache_file: str | None = None, **load_options) -> Dict[str, Any]:
+    '''
+    Load several CSV files into DB, file_workers files at a time.
+    The largest files start first, so that a long file does not straggle at the end of the run.
+    The files share the entity ids, the index of existing items and the categorizer (see data_loader.LoadCaches).
+    Every fully loaded file is recorded in LoadManifest and skipped on the next run, so a directory can be
+    loaded again after an interrupted run: the files loaded before are skipped, the items already written
+    from a partially loaded file are skipped by the deduplication. Files with the same content are loaded once
+    (the first one in the order of paths).
+    The copy mode and the 'query' deduplication do not claim the items they write: with them the files are
+    loaded one at a time, so that two files never insert the same item.
+    load_options are those of data_loader.load_restaurants_data_from_csv_to_db.
+
+    Returns the run report: the totals and, for every file, its size, status (loaded, already_loaded,
+    duplicate, failed), seconds and load statistics or error
+    '''
+    if file_workers < 1:
+        raise ValueError('The number of file workers must be a positive number')
+    if load_options.get('mode') == 'copy' or load_options.get('dedup') == 'query':
+        file_workers = 1
+
+    start_time = time.perf_counter()
+    categorizer = _create_categorizer(rules_file, match_cache_file)
+    cache_hits, cache_misses = categorizer.match_cache.hits, categorizer.match_cache.misses
+    caches = LoadCaches(categorizer)
+
+    files: Dict[str, Dict[str, Any]] = {path: {'bytes': _file_size(path)} for path in paths}
+
+    def load_file(path: str) -> Dict[str, Any]:
+        file_start_time = time.perf_counter()
+        try:
+            stats = load_restaurants_data_from_csv_to_db(path, caches=caches, skip_loaded_files=True, **load_options)
+            status = 'already_loaded' if stats.pop('already_loaded', False) else \
+                'failed' if stats['failed'] else 'loaded'
+            return {'status': status, 'stats': stats}
+        except Exception as exception:
+            return {'status': 'failed', 'error': repr(exception)}
+        finally:
+            metrics.count('files')
+            files[path]['seconds'] = round(time.perf_counter() - file_start_time, 6)
+
+    with ThreadPoolExecutor(max_workers=file_workers, thread_name_prefix='file') as pool:
+        # A file with the same content as an earlier one is not loaded twice
+        originals: Dict[str, str] = {}
+        for path, content_hash in zip(paths, pool.map(_content_hash, paths)):
+            if content_hash is None:
+                files[path].update(status='failed', error='File not found')
+            elif content_hash in originals:
+                files[path].update(status='duplicate', duplicate_of=originals[content_hash])
+            else:
+                originals[content_hash] = path
+
+        # Longest processing time first
+        ordered = sorted(originals.values(), key=lambda path: -files[path]['bytes'])
+        futures = {pool.submit(load_file, path): path for path in ordered}
+        for future in as_completed(futures):
+            files[futures[future]].update(future.result())
+
+    totals: Dict[str, int] = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    statuses: Dict[str, int] = {}
+    for result in files.values():
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        if result['status'] in ('loaded', 'failed') and 'stats' in result:
+            for name in totals:
+                totals[name] += result['stats'][name]
+    return {**totals, 'files': files, 'statuses': statuses, 'file_workers': file_workers,
+            'seconds': round(time.perf_counter() - start_time, 6),
+            'match_cache': _match_cache_stats(categorizer, cache_hits, cache_misses)}
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from models import FoodItem, LoadManifest, Restaurant
+from csv_schema import column_list, exact_floats
+from metrics import metrics
+
+# Columns of the content hash of a food item: the restaurant, item name and nutrition values of its row
+hash_text_columns: List[str] = ['restaurant', 'item', 'salad']
+hash_number_columns: List[str] = list(column_list[2:-1])
+
+
+@metrics.timed('file_hash')
+def file_hash(filename: str, block_size: int = 1 << 20) -> str:
+    '''SHA-256 of the file content'''
+    digest = hashlib.sha256()
+    try:
+        with open(filename, 'rb') as file:
+            while block := file.read(block_size):
+                digest.update(block)
+    except FileNotFoundError:
+        raise FileNotFoundError('File not found in the root directory')
+    return digest.hexdigest()
+
+
+def row_hashes(data: pd.DataFrame, text_columns: List[str], numeric_columns: List[str]) -> pd.Series:
+    '''
+    MD5 of every row over the given columns.
+    Numbers are normalized to floats so that 10 and 10.0 give the same hash, missing values are empty
+    '''
+    parts = []
+    for column in text_columns:
+        values = data[column].astype(object)
+        parts.append(values.where(values.map(lambda value: isinstance(value, str)), ''))
+    for column in numeric_columns:
+        values = pd.Series(exact_floats(data[column]), index=data.index)
+        parts.append(values.astype(str).where(values.notna(), ''))
+
+    rows = parts[0].str.cat(parts[1:], sep='\x1f')
+    return pd.Series([hashlib.md5(row.encode()).hexdigest() for row in rows], index=data.index)
+
+
+def is_file_loaded(session, content_hash: str) -> LoadManifest | None:
+    return session.scalars(select(LoadManifest).where(LoadManifest.file_hash == content_hash)).first()
+
+
+class ItemHashes:
+    '''
+    In-memory index of the food items already in DB: restaurant id -> item name -> (item id, content hash).
+    Loaded with a single streamed query. Items stored without a content hash (written before the loader
+    stored hashes) are hashed from their values in DB, so unchanged items are not updated
+    '''
+    @metrics.timed('content_hash_preload')
+    def __init__(self, session, yield_per: int = 10000) -> None:
+        self.items: Dict[int, Dict[str, Tuple[int | None, str | None]]] = {}
+        self._lock = threading.RLock()
+
+        rows = session.execute(select(
+            FoodItem.restaurant_id, FoodItem.name, FoodItem.id, FoodItem.content_hash
+        ).execution_options(yield_per=yield_per))
+        unhashed = False
+        for restaurant_id, name, food_item_id, content_hash in rows:
+            self.items.setdefault(restaurant_id, {})[name] = (food_item_id, content_hash)
+            unhashed = unhashed or content_hash is None
+        if unhashed:
+            self._hash_stored_items(session)
+
+    def _hash_stored_items(self, session) -> None:
+        number_columns = [getattr(FoodItem, column) for column in hash_number_columns]
+        rows = session.execute(select(
+            FoodItem.restaurant_id, FoodItem.id, Restaurant.name, FoodItem.name, FoodItem.salad, *number_columns
+        ).join(Restaurant, FoodItem.restaurant_id == Restaurant.id).where(FoodItem.content_hash.is_(None))).all()
+        data = pd.DataFrame(rows, columns=['restaurant_id', 'id', 'restaurant', 'item', 'salad', *hash_number_columns])
+        hashes = row_hashes(data, hash_text_columns, hash_number_columns)
+        for restaurant_id, name, food_item_id, content_hash in zip(data['restaurant_id'], data['item'], data['id'],
+                                                                   hashes):
+            self.items[restaurant_id][name] = (food_item_id, content_hash)
+
+    def split(self, restaurant_id: int, names: pd.Series,
+              hashes: pd.Series) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+        '''
+        Compare the rows of a restaurant with DB, return the masks of new rows and changed rows
+        and the ids of the changed items.
+        Items written earlier in the same load (no id) are never changed again, the first row wins
+        '''
+        existing = self.items.get(restaurant_id, {})
+        new = np.zeros(len(names), dtype=bool)
+        changed = np.zeros(len(names), dtype=bool)
+        changed_ids = []
+        for position, (name, content_hash) in enumerate(zip(names, hashes)):
+            food_item_id, existing_hash = existing.get(name, (None, None))
+            if name not in existing:
+                new[position] = True
+            elif food_item_id is not None and existing_hash != content_hash:
+                changed[position] = True
+                changed_ids.append(food_item_id)
+        return new, changed, changed_ids
+
+    def add(self, restaurant_id: int, names: pd.Series, hashes: pd.Series) -> None:
+        # Remember the items written during the load
+        with self._lock:
+            existing = self.items.setdefault(restaurant_id, {})
+            for name, content_hash in zip(names, hashes):
+                existing[name] = (None, content_hash)
+
+    def claim(self, restaurant_id: int, names: pd.Series,
+              hashes: pd.Series) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+        '''
+        split() and remember the new rows at once: when loaders share this index,
+        every new item is inserted by the first one which claims it
+        '''
+        with self._lock:
+            new, changed, changed_ids = self.split(restaurant_id, names, hashes)
+            self.add(restaurant_id, names[new], hashes[new])
+        return new, changed, changed_ids
+
+    def release(self, restaurant_id: int, names: Iterable[str]) -> None:
+        # Forget claimed items which were rolled back, another loader may write them
+        with self._lock:
+            existing = self.items.get(restaurant_id, {})
+            for name in names:
+                existing.pop(name, None)
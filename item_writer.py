@@ -0,0 +1,229 @@
+import csv
+import io
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from sqlalchemy import Column, Integer, MetaData, Table, delete, func, insert, select, text, update
+from models import FoodItem, FoodItemSubcategory
+from load_options import DEFAULT_BATCH_SIZE
+
+
+# A food item to write: column values of the FoodItem row and ids of its subcategories
+ItemRecord = Tuple[Dict[str, Any], List[int]]
+
+
+def batched(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    '''Split an iterable into lists of at most batch_size elements'''
+    iterator = iter(items)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+class RowItemWriter:
+    '''
+    Writes food items one by one through the ORM (two flushes per item).
+    Kept as a reference path for comparison with the bulk writer
+    '''
+    def __init__(self, session) -> None:
+        self.session = session
+
+    def write(self, items: Iterable[ItemRecord]) -> int:
+        written = 0
+        for values, subcategory_ids in items:
+            # Create a new food item and add it to the session
+            food_item = FoodItem(**values)
+            self.session.add(food_item)
+
+            self.session.flush()
+
+            # Add the food item to the corresponding subcategories
+            for subcategory_id in subcategory_ids:
+                self.session.add(FoodItemSubcategory(
+                    food_item_id=food_item.id, subcategory_id=subcategory_id))
+
+            self.session.flush()
+            written += 1
+        return written
+
+
+class BulkItemWriter:
+    '''
+    Writes food items in batches: one multi-row INSERT ... RETURNING per batch of items
+    and one executemany INSERT for the subcategory links of the batch.
+    The returned ids are matched to the items by restaurant and name (unique, see FoodItem).
+    With skip_existing the items are inserted with ON CONFLICT DO NOTHING (PostgreSQL, SQLite),
+    so items already in DB are skipped by the database itself
+    '''
+    def __init__(self, session, batch_size: int = DEFAULT_BATCH_SIZE, skip_existing: bool = False) -> None:
+        if batch_size < 1:
+            raise ValueError('The batch size must be a positive number')
+        self.session = session
+        self.batch_size = batch_size
+        self.skip_existing = skip_existing
+
+        food_items = FoodItem.__table__
+        if skip_existing:
+            dialect = session.get_bind().dialect.name
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            elif dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                raise ValueError(f'ON CONFLICT is not supported by {dialect}')
+            statement = dialect_insert(food_items).on_conflict_do_nothing(index_elements=['restaurant_id', 'name'])
+        else:
+            statement = insert(food_items)
+        # Without sort_by_parameter_order the rows of a batch are sent in one statement (insertmanyvalues)
+        self._insert = statement.returning(food_items.c.id, food_items.c.restaurant_id, food_items.c.name)
+
+    def write(self, items: Iterable[ItemRecord]) -> int:
+        written = 0
+        for batch in batched(items, self.batch_size):
+            # Only the inserted items are returned, match them to the batch by restaurant and name
+            inserted = {(restaurant_id, name): food_item_id for food_item_id, restaurant_id, name
+                        in self.session.execute(self._insert, [values for values, _ in batch])}
+
+            # Insert the links to subcategories of the whole batch at once
+            links = []
+            for values, subcategory_ids in batch:
+                food_item_id = inserted.get((values['restaurant_id'], values['name']))
+                if food_item_id is not None:
+                    links.extend({'food_item_id': food_item_id, 'subcategory_id': subcategory_id}
+                                 for subcategory_id in subcategory_ids)
+            if links:
+                self.session.execute(insert(FoodItemSubcategory), links)
+            written += len(inserted)
+        return written
+
+    def update(self, items: Iterable[ItemRecord], food_item_ids: Iterable[int]) -> int:
+        '''
+        Overwrite existing food items (by id) with new values and replace their subcategory links
+        '''
+        updated = 0
+        for batch in batched(zip(food_item_ids, items), self.batch_size):
+            ids = [food_item_id for food_item_id, _ in batch]
+            self.session.execute(update(FoodItem), [dict(values, id=food_item_id) for food_item_id, (values, _) in batch])
+
+            self.session.execute(delete(FoodItemSubcategory).where(FoodItemSubcategory.food_item_id.in_(ids)))
+            links = [{'food_item_id': food_item_id, 'subcategory_id': subcategory_id}
+                     for food_item_id, (_, subcategory_ids) in batch for subcategory_id in subcategory_ids]
+            if links:
+                self.session.execute(insert(FoodItemSubcategory), links)
+            updated += len(batch)
+        return updated
+
+
+# Staging tables used by the COPY writer (temporary, so every connection gets its own)
+staging_metadata = MetaData()
+
+staging_food_items = Table(
+    'staging_food_items', staging_metadata,
+    Column('row_no', Integer, primary_key=True),
+    Column('food_item_id', Integer),
+    *[Column(column.name, column.type) for column in FoodItem.__table__.columns if column.name != 'id'],
+    prefixes=['TEMPORARY'])
+
+staging_food_item_subcategory = Table(
+    'staging_food_item_subcategory', staging_metadata,
+    Column('row_no', Integer),
+    Column('subcategory_id', Integer),
+    prefixes=['TEMPORARY'])
+
+
+class CopyItemWriter:
+    '''
+    Streams food items into temporary staging tables and merges them into food_items and
+    food_item_subcategory with set-based SQL.
+    On PostgreSQL the rows are sent with COPY FROM STDIN in chunks of batch_size rows,
+    on other databases (SQLite) they are inserted with executemany.
+    The merge skips items that already exist in DB (same restaurant and name),
+    if the same name is staged several times for a restaurant only the first row is kept
+    '''
+    def __init__(self, session, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+        if batch_size < 1:
+            raise ValueError('The batch size must be a positive number')
+        self.session = session
+        self.batch_size = batch_size
+        self.use_copy = session.get_bind().dialect.name == 'postgresql'
+        self.row_no = 0
+        self._item_columns = [column.name for column in staging_food_items.columns
+                              if column.name not in ('row_no', 'food_item_id')]
+
+        connection = session.connection()
+        staging_metadata.drop_all(connection)
+        staging_metadata.create_all(connection)
+
+    def write(self, items: Iterable[ItemRecord]) -> int:
+        '''Stage the items, nothing is written to food_items until merge()'''
+        staged = 0
+        for batch in batched(items, self.batch_size):
+            item_rows, link_rows = [], []
+            for values, subcategory_ids in batch:
+                self.row_no += 1
+                item_rows.append(dict(values, row_no=self.row_no))
+                link_rows.extend({'row_no': self.row_no, 'subcategory_id': subcategory_id}
+                                 for subcategory_id in subcategory_ids)
+
+            self._stage(staging_food_items, item_rows)
+            self._stage(staging_food_item_subcategory, link_rows)
+            staged += len(batch)
+        return staged
+
+    def _stage(self, table: Table, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if not self.use_copy:
+            self.session.execute(insert(table), rows)
+            return
+
+        # Serialize the rows to CSV (None becomes an unquoted empty field, i.e. NULL)
+        columns = [column.name for column in table.columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row.get(column) for column in columns])
+        buffer.seek(0)
+
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+        finally:
+            cursor.close()
+
+    def merge(self) -> int:
+        '''Move the staged items into food_items and food_item_subcategory, return the number of new items'''
+        staged = staging_food_items.c
+        links = staging_food_item_subcategory.c
+        food_items = FoodItem.__table__
+
+        # Keep only the first row of every (restaurant, name) which is not in DB yet
+        first_rows = select(func.min(staged.row_no)).group_by(
+            staged.restaurant_id, staged.name).correlate(None)
+        existing = select(food_items.c.id).where(
+            (food_items.c.restaurant_id == staged.restaurant_id) & (food_items.c.name == staged.name)).exists()
+        self.session.execute(delete(staging_food_items).where(
+            staged.row_no.not_in(first_rows) | existing))
+
+        # Assign ids to the new items up front, so the links can be matched by row number
+        if self.use_copy:
+            self.session.execute(text(
+                "UPDATE staging_food_items AS s SET food_item_id = ids.id FROM ("
+                "SELECT row_no, nextval(pg_get_serial_sequence('food_items', 'id')) AS id "
+                "FROM staging_food_items ORDER BY row_no) AS ids WHERE s.row_no = ids.row_no"))
+        else:
+            max_id = select(func.coalesce(func.max(food_items.c.id), 0)).scalar_subquery()
+            self.session.execute(update(staging_food_items).values(food_item_id=max_id + staged.row_no))
+
+        inserted = self.session.execute(insert(food_items).from_select(
+            ['id', *self._item_columns],
+            select(staged.food_item_id, *[staged[column] for column in self._item_columns]).order_by(
+                staged.row_no))).rowcount
+
+        self.session.execute(insert(FoodItemSubcategory.__table__).from_select(
+            ['food_item_id', 'subcategory_id'],
+            select(staged.food_item_id, links.subcategory_id).select_from(
+                staging_food_item_subcategory.join(staging_food_items, links.row_no == staged.row_no)
+            ).order_by(staged.row_no)))
+
+        staging_metadata.drop_all(self.session.connection())
+        return inserted
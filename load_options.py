@@ -0,0 +1,27 @@
+# Options of the loader, in a module without dependencies so that the command line
+# can be parsed without importing pandas or SQLAlchemy
+
+# Available ways of writing food items to DB
+load_modes = ('bulk', 'row', 'copy')
+
+# Available ways of finding the items which are already in DB:
+# - 'preload': load all (restaurant_id, name) pairs once and check in memory
+# - 'query': one IN-list query per restaurant
+# - 'db': insert everything with INSERT ... ON CONFLICT DO NOTHING and let DB skip existing items
+dedup_modes = ('preload', 'query', 'db')
+
+# CSV parsers of pandas: the C engine or pyarrow (requires pyarrow, cannot read in chunks)
+csv_engines = ('c', 'pyarrow')
+
+# How the file is read: at once with pandas, or memory-mapped with the rows of one restaurant parsed at a time
+# (mmap, uncompressed files only, see mmap_reader)
+csv_readers = ('pandas', 'mmap')
+
+# Number of food items per INSERT batch
+DEFAULT_BATCH_SIZE = 1000
+
+# Elements (chunks or restaurants) waiting between two stages of the async pipeline
+DEFAULT_QUEUE_SIZE = 4
+
+# Files loaded at the same time when several files are given
+DEFAULT_FILE_WORKERS = 4
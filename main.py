@@ -1,35 +1,270 @@
-import time
-from data_loader import load_restaurants_data_from_csv_to_db
-from data_processing import calculate_rank_and_upload
 import argparse
+import glob
+import json
+import os
+import sys
+import time
+from load_options import (DEFAULT_BATCH_SIZE, DEFAULT_FILE_WORKERS, DEFAULT_QUEUE_SIZE, csv_engines, csv_readers,
+                          dedup_modes, load_modes)
+
+# Every command imports the modules it needs when it runs: parsing the command line does not load
+# pandas, SQLAlchemy or matplotlib, and "load" does not import the export and plotting code
+commands = ('run', 'load', 'export', 'plot')
+
+
+def add_db_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--database-url', help='DB URL (default: DATABASE_URL or sqlalchemy.url in alembic.ini)')
+    parser.add_argument('--engine-option', action='append', default=[], metavar='KEY=VALUE',
+                        help='SQLAlchemy engine option, e.g. pool_size=10 or insertmanyvalues_page_size=5000 '
+                             '(may be repeated)')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='Collect per-stage timings, row, SQL statement and round trip counts and write them '
+                             'to FILE: Prometheus text format if it ends with .prom, JSON otherwise ("-" prints them)')
+
+
+def add_load_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('paths', nargs='*', metavar='PATH',
+                        help='CSV files to load (default: fastfood.csv), directories (searched for .csv, .csv.gz, '
+                             '.csv.bz2 and .csv.zst files) or glob patterns such as "data/**/*.csv.gz"')
+    parser.add_argument( '--interactive', action='store_true', help='Interactive mode')
+    parser.add_argument('--mode', choices=load_modes, default='bulk',
+                        help='How food items are written to DB: in batches (bulk), one by one (row) '
+                             'or through a staging table loaded with COPY (copy)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Number of food items per INSERT batch')
+    parser.add_argument('--dedup', choices=dedup_modes, default='preload',
+                        help='How existing items are skipped: preloaded name set (preload), '
+                             'a query per restaurant (query) or ON CONFLICT DO NOTHING in DB (db)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of threads loading restaurants in parallel (bulk and row modes)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip unchanged files, insert new rows and update items whose values changed (bulk mode)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Read the CSV in chunks of N rows to keep memory bounded for large files')
+    parser.add_argument('--csv-engine', choices=csv_engines, default='c',
+                        help='pandas CSV parser: C (default) or pyarrow (requires pyarrow, not used with --chunksize)')
+    parser.add_argument('--reader', choices=csv_readers, default='pandas',
+                        help='Read the whole CSV with pandas (default) or map it in memory and parse one restaurant '
+                             'at a time (mmap: low memory, parallel parsing with --workers, uncompressed files)')
+    parser.add_argument('--commit-rows', type=int, default=None, metavar='N',
+                        help='Commit the restaurants in transactions of at least N rows instead of one per restaurant '
+                             '(one worker, bulk and row modes)')
+    parser.add_argument('--commit-bytes', type=int, default=None, metavar='BYTES',
+                        help='Commit the restaurants in transactions of at least BYTES bytes of parsed rows')
+    parser.add_argument('--resume', action='store_true',
+                        help='Record the progress of the load and continue an interrupted one after its last '
+                             'committed restaurant (same --chunksize)')
+    parser.add_argument('--async', dest='async_pipeline', action='store_true',
+                        help='Parse, categorize and write concurrently with the asyncio engine (aiosqlite/asyncpg), '
+                             'bulk and row modes')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='Chunks or restaurants waiting between two stages of the --async pipeline')
+    parser.add_argument('--file-workers', type=int, default=DEFAULT_FILE_WORKERS,
+                        help='Number of files loaded in parallel when several files are given, largest first')
+    parser.add_argument('--report', default=None, metavar='FILE',
+                        help='Write the report of a multi-file load (status and numbers per file) to FILE as JSON')
+    parser.add_argument('--rules', default=None, metavar='FILE',
+                        help='JSON or YAML file with the category and subcategory rules (default: the built-in rules, '
+                             'see rules.yaml)')
+    parser.add_argument('--match-cache', default=None, metavar='FILE',
+                        help='SQLite file keeping the keyword matches of item names between runs '
+                             '(emptied when the rules change)')
+
+
+def add_export_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--export-file', default='food_cats.csv',
+                        help='File for the exported items: CSV (gzip-compressed if it ends with .gz), '
+                             'Parquet (.parquet) or Arrow IPC (.arrow, .feather)')
+    parser.add_argument('--export-columns', type=lambda value: value.split(','), default=None,
+                        help='Comma-separated columns of the Parquet/Arrow export (default: all)')
+    parser.add_argument('--stream-export', action='store_true',
+                        help='Write the export in batches from a server-side cursor (COPY on PostgreSQL)')
+
+
+def add_plot_arguments(parser: argparse.ArgumentParser, concurrent: bool) -> None:
+    parser.add_argument('--plot-file', default=None,
+                        help='Render the plot into a PNG/SVG file (no display needed)' +
+                             (' while the export runs, instead of showing it before the export' if concurrent else ''))
 
-parser = argparse.ArgumentParser(description='Load data from CSV to DB and calculate rank')
-parser.add_argument( '--interactive', action='store_true', help='Interactive mode')
 
-def main():
+parser = argparse.ArgumentParser(description='Load data from CSV to DB and calculate rank',
+                                 epilog='Without a command, "run" is executed')
+subparsers = parser.add_subparsers(dest='command', metavar='{' + ','.join(commands) + '}')
 
+run_parser = subparsers.add_parser('run', help='Load the CSV, plot the statistics and export the items (default)')
+load_parser = subparsers.add_parser('load', help='Load the CSV into DB')
+export_parser = subparsers.add_parser('export', help='Export the items to CSV, Parquet or Arrow')
+plot_parser = subparsers.add_parser('plot', help='Plot the restaurants with the least carbs')
 
+for command_parser in (run_parser, load_parser, export_parser, plot_parser):
+    add_db_arguments(command_parser)
+for command_parser in (run_parser, load_parser):
+    add_load_arguments(command_parser)
+for command_parser in (run_parser, export_parser):
+    add_export_arguments(command_parser)
+add_plot_arguments(run_parser, concurrent=True)
+add_plot_arguments(plot_parser, concurrent=False)
 
-    args = parser.parse_args()
 
+def configure_db(args) -> None:
+    # Configure the DB engine shared by the loader and the exporter
+    from session import configure, parse_engine_option
 
+    engine_options = {}
+    try:
+        for option in args.engine_option:
+            engine_options.update(parse_engine_option(option))
+    except ValueError as error:
+        parser.error(str(error))
+    configure(args.database_url, **engine_options)
+
+
+def load_many(args, patterns) -> int:
+    from file_scheduler import expand_paths, load_files
+
+    paths = expand_paths(patterns)
+    if not paths:
+        parser.error(f'No CSV file found in {", ".join(patterns)}')
+
+    report = load_files(paths, args.file_workers, args.rules, args.match_cache, mode=args.mode,
+                        batch_size=args.batch_size, chunksize=args.chunksize, dedup=args.dedup, workers=args.workers,
+                        incremental=args.incremental, csv_engine=args.csv_engine, reader=args.reader,
+                        commit_rows=args.commit_rows, commit_bytes=args.commit_bytes, resume=args.resume)
+
+    print(f"DataLoad: {report['seconds']} seconds, {len(paths)} files ({report['file_workers']} at a time)")
+    print(f"  {report['inserted']} rows inserted, {report['updated']} updated, {report['skipped']} skipped")
+    print('  ' + ', '.join(f'{count} {status}' for status, count in report['statuses'].items()))
+    for path, result in report['files'].items():
+        if result['status'] == 'loaded':
+            print(f"  {path}: {result['stats']['inserted']} inserted, {result['stats']['updated']} updated, "
+                  f"{result['stats']['skipped']} skipped, {result['seconds']:.3f} seconds")
+        elif result['status'] == 'duplicate':
+            print(f"  {path}: same content as {result['duplicate_of']}")
+        elif result['status'] == 'failed':
+            print(f"  {path}: failed, {result.get('error') or result['stats']['failed']}")
+        else:
+            print(f"  {path}: already loaded")
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=2)
+            file.write('\n')
+    return 1 if 'failed' in report['statuses'] else 0
+
+
+def load(args) -> int:
     # Load the data from the CSV file
     defalut_file = 'fastfood.csv'
 
     # Ask the user to enter filename if in interactive mode
-    input_file = input(f"Enter the name of the file to load (default: {defalut_file}): ") if args.interactive else defalut_file
-    
+    if args.interactive:
+        patterns = [input(f"Enter the name of the file to load (default: {defalut_file}): ") or defalut_file]
+    else:
+        patterns = args.paths or [defalut_file]
+
+    # Several files, a directory or a pattern: the files are scheduled in parallel
+    if len(patterns) > 1 or any(os.path.isdir(pattern) or glob.has_magic(pattern) for pattern in patterns):
+        if args.async_pipeline:
+            parser.error('--async loads a single file')
+        return load_many(args, patterns)
+    input_file = patterns[0]
+
+    if args.async_pipeline:
+        if args.workers > 1 or args.incremental or args.resume or args.commit_rows or args.commit_bytes:
+            parser.error('--async cannot be combined with --workers, --incremental, --resume or --commit-*')
+        from async_loader import run_async_load
+    else:
+        from data_loader import load_restaurants_data_from_csv_to_db
+
     start_time = time.time()
-    load_restaurants_data_from_csv_to_db(input_file or defalut_file)
+    if args.async_pipeline:
+        load_stats = run_async_load(input_file, mode=args.mode, batch_size=args.batch_size,
+                                    chunksize=args.chunksize, dedup=args.dedup, queue_size=args.queue_size,
+                                    rules_file=args.rules, match_cache_file=args.match_cache,
+                                    csv_engine=args.csv_engine, reader=args.reader)
+    else:
+        load_stats = load_restaurants_data_from_csv_to_db(input_file, mode=args.mode, batch_size=args.batch_size,
+                                                          chunksize=args.chunksize, dedup=args.dedup,
+                                                          workers=args.workers, incremental=args.incremental,
+                                                          rules_file=args.rules, match_cache_file=args.match_cache,
+                                                          csv_engine=args.csv_engine, reader=args.reader,
+                                                          commit_rows=args.commit_rows, commit_bytes=args.commit_bytes,
+                                                          resume=args.resume)
     end_time = time.time()
-    
+
     elapsed_time = end_time - start_time
     print(f"DataLoad: {elapsed_time} seconds")
+    if 'resumed' in load_stats:
+        print(f"  Resumed after {load_stats['resumed']['restaurant']} "
+              f"({load_stats['resumed']['rows']} rows committed before)")
+    print(f"  {load_stats['inserted']} rows inserted, {load_stats['updated']} updated, {load_stats['skipped']} skipped")
+    for worker, worker_stats in load_stats['workers'].items():
+        print(f"  {worker}: {worker_stats['restaurants']} restaurants, {worker_stats['inserted']} inserted, "
+              f"{worker_stats['updated']} updated, {worker_stats['skipped']} skipped, "
+              f"{worker_stats['seconds']:.3f} seconds")
+    for queue, queue_stats in load_stats.get('queues', {}).items():
+        print(f"  Queue {queue}: {queue_stats['max_depth']}/{queue_stats['capacity']} max depth, "
+              f"{queue_stats['mean_depth']} mean, {queue_stats['blocked_seconds']:.3f} seconds blocked")
+    for restaurant_name, error in load_stats['failed'].items():
+        print(f"  Failed to load {restaurant_name}: {error}")
+    match_cache = load_stats.get('match_cache')
+    if match_cache and match_cache['hit_rate'] is not None:
+        print(f"  Match cache: {match_cache['hits']} hits, {match_cache['misses']} misses "
+              f"({match_cache['hit_rate']:.1%}), {match_cache['size']} names")
+    return 1 if load_stats['failed'] else 0
+
+
+def export(args) -> None:
+    from data_processing import export_items
+    from session import DBSession
+
+    with DBSession() as session:
+        export_items(session, args.export_file, args.stream_export, args.export_columns)
+
+
+def plot(args) -> None:
+    from data_processing import plot_statistics
+
+    plot_statistics(args.plot_file)
+
+
+def run(args) -> int:
+    from data_processing import calculate_rank_and_upload
+
+    # Nothing is exported when restaurants or files failed to load
+    status = load(args)
+    if status:
+        return status
 
     # Calculate the rank and upload the data about categories and subcategories to CSV
-    calculate_rank_and_upload()
+    calculate_rank_and_upload(args.export_file, args.stream_export, args.export_columns, args.plot_file)
+    return 0
 
 
-if __name__ == "__main__":
-    main()
+def main(argv=None):
+
+
+
+    argv = sys.argv[1:] if argv is None else argv
+    # Keep "python main.py --mode copy ..." working: options without a command belong to "run"
+    if not argv or argv[0] not in commands and argv[0] not in ('-h', '--help'):
+        argv = ['run', *argv]
+    args = parser.parse_args(argv)
 
+    configure_db(args)
+    if args.metrics:
+        from metrics import metrics
+        metrics.enable()
+
+    status = {'run': run, 'load': load, 'export': export, 'plot': plot}[args.command](args)
+
+    if args.metrics:
+        if args.metrics == '-':
+            print(metrics.to_json())
+        else:
+            metrics.write(args.metrics)
+    # Non-zero exit status when restaurants or files failed to load
+    return status or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import functools
+import json
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict
+
+from sqlalchemy import Engine, event
+
+# Prefix of the metric names in the Prometheus text format
+PROMETHEUS_PREFIX = 'food_loader'
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start_time')
+
+    def __init__(self, metrics: 'Metrics', name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start_time = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.metrics.add_time(self.name, time.perf_counter() - self.start_time)
+
+
+class Metrics:
+    '''
+    Timers and counters of the load pipeline: time and calls per stage, rows, SQL statements and
+    DB round trips (counted with SQLAlchemy events on every engine).
+    Disabled by default: timers are then a shared no-op context and no event listener is installed.
+    Thread-safe, the load workers add to the same metrics
+    '''
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.timers: Dict[str, list] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def enable(self) -> None:
+        '''Reset the metrics and start collecting them'''
+        self.timers, self.counters = {}, {}
+        if not self.enabled:
+            event.listen(Engine, 'before_execute', self._on_execute)
+            event.listen(Engine, 'before_cursor_execute', self._on_cursor_execute)
+            self.enabled = True
+
+    def disable(self) -> None:
+        if self.enabled:
+            event.remove(Engine, 'before_execute', self._on_execute)
+            event.remove(Engine, 'before_cursor_execute', self._on_cursor_execute)
+            self.enabled = False
+
+    def timer(self, name: str):
+        '''Context manager adding its duration to the timer of a stage'''
+        return _Timer(self, name) if self.enabled else nullcontext()
+
+    def timed(self, name: str) -> Callable:
+        '''Decorator timing every call of a function as a stage'''
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Timer(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+
+    def count(self, name: str, value: int = 1, label: str = '') -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            counter = self.counters.setdefault(name, {})
+            counter[label] = counter.get(label, 0) + value
+
+    def _on_execute(self, conn, clauseelement, multiparams, params, execution_options) -> None:
+        # A statement executed by the application (Core or ORM)
+        self.count('sql_statements')
+
+    def _on_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        # A call to the DB driver, labelled with the SQL verb
+        self.count('db_round_trips', label=statement.lstrip().split(None, 1)[0].lower() if statement.strip() else '')
+
+    def report(self) -> Dict[str, Any]:
+        '''Metrics as a dict: stage -> calls and seconds, counter -> value (or value per label)'''
+        with self._lock:
+            return {
+                'stages': {name: {'calls': calls, 'seconds': round(seconds, 6)}
+                           for name, (calls, seconds) in sorted(self.timers.items())},
+                'counters': {name: counter[''] if list(counter) == [''] else dict(sorted(counter.items()))
+                             for name, counter in sorted(self.counters.items())},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.report(), indent=2)
+
+    def to_prometheus(self) -> str:
+        '''Metrics in the Prometheus text exposition format'''
+        report = self.report()
+        lines = [f'# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter']
+        lines += [f'{PROMETHEUS_PREFIX}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]}'
+                  for name, stage in report['stages'].items()]
+        lines.append(f'# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter')
+        lines += [f'{PROMETHEUS_PREFIX}_stage_calls_total{{stage="{name}"}} {stage["calls"]}'
+                  for name, stage in report['stages'].items()]
+        for name, counter in report['counters'].items():
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name}_total counter')
+            if isinstance(counter, dict):
+                lines += [f'{PROMETHEUS_PREFIX}_{name}_total{{kind="{label}"}} {value}' for label, value in counter.items()]
+            else:
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}_total {counter}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file_name: str) -> None:
+        '''Write the report to a file: Prometheus text format for .prom files, JSON otherwise'''
+        with open(file_name, 'w') as file:
+            file.write(self.to_prometheus() if file_name.endswith('.prom') else self.to_json() + '\n')
+
+
+# Metrics of the current run, shared by all modules
+metrics = Metrics()
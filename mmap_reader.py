@@ -0,0 +1,180 @@
+import csv
+import io
+import mmap
+import os
+from typing import Dict, List
+import numpy as np
+
+# Bytes of the mapped file scanned at a time (a multiple of the page size): the temporary arrays of a block
+# (positions of newlines, commas and quotes) take several times its size
+BLOCK_SIZE = 1 << 20
+
+# Leading bytes of the keys compared with numpy, the rest of longer keys is compared in Python
+KEY_WIDTH = 32
+
+NEWLINE, QUOTE, COMMA, CARRIAGE_RETURN = ord('\n'), ord('"'), ord(','), ord('\r')
+
+
+class MappedCSV:
+    '''
+    CSV file mapped in memory (mmap) and scanned block by block with numpy: rows end at the newlines outside
+    quoted fields, consecutive rows with the same key column (restaurant) form a run of bytes.
+    The file is never read into the process memory: only the rows of one key are copied when they are parsed,
+    and the pages of the scanned blocks are released from the mapping (MADV_DONTNEED), so the resident memory
+    stays well below the file size.
+    Works best when the rows of a key are grouped, as in fastfood.csv: interleaved keys give one range per row
+    '''
+    def __init__(self, filename: str, key_column: str = 'restaurant', block_size: int = BLOCK_SIZE) -> None:
+        try:
+            self._file = open(filename, 'rb')
+        except FileNotFoundError:
+            raise FileNotFoundError('File not found in the root directory')
+        self.size = os.fstat(self._file.fileno()).st_size
+        if self.size == 0:
+            self._file.close()
+            raise ValueError('The data frame is empty')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.block_size = max(mmap.PAGESIZE, block_size // mmap.PAGESIZE * mmap.PAGESIZE)
+
+        header_end = self.buffer.find(b'\n')
+        self.data_start = self.size if header_end < 0 else header_end + 1
+        self.header = self.buffer[:self.data_start]
+        self.columns: List[str] = next(csv.reader([self.header.decode('utf-8-sig').rstrip('\r\n')]), [])
+        self.key_index = self.columns.index(key_column) if key_column in self.columns else None
+
+    def close(self) -> None:
+        self.buffer.close()
+        self._file.close()
+
+    def __enter__(self) -> 'MappedCSV':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _release(self, start: int, end: int) -> None:
+        # Drop the pages of a byte range from the resident memory (they are read again from the file if needed)
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            start = start // mmap.PAGESIZE * mmap.PAGESIZE
+            self.buffer.madvise(mmap.MADV_DONTNEED, start, min(end, self.size) - start)
+
+    @staticmethod
+    def _row_ends(data: np.ndarray, position: int, stop: int) -> np.ndarray:
+        # Ends (exclusive) of the rows from position (a row start) to stop: newlines after an even number of quotes
+        block = data[position:stop]
+        newlines = np.flatnonzero(block == NEWLINE)
+        quotes = np.flatnonzero(block == QUOTE)
+        if len(quotes):
+            newlines = newlines[np.searchsorted(quotes, newlines) % 2 == 0]
+        return newlines + position + 1
+
+    def _keys(self, data: np.ndarray, position: int, stop: int, starts: np.ndarray, ends: np.ndarray) -> tuple:
+        '''Start and end of the key field of every row, and the rows whose key must be parsed with csv'''
+        block = data[position:stop]
+        commas = np.flatnonzero(block == COMMA) + position
+        quotes = np.flatnonzero(block == QUOTE) + position
+        if not len(commas):
+            return starts, ends, np.ones(len(starts), dtype=bool)
+        first_comma = np.searchsorted(commas, starts)
+        if self.key_index == 0:
+            key_starts = starts
+        else:
+            key_starts = commas[np.minimum(first_comma + self.key_index - 1, len(commas) - 1)] + 1
+        key_ends = commas[np.minimum(first_comma + self.key_index, len(commas) - 1)]
+        # The key is the last field of the row (no comma after it in the row) or a quoted field,
+        # which may contain commas: these rows are parsed with csv
+        last_field = (first_comma + self.key_index >= len(commas)) | (key_ends >= ends)
+        quoted = np.searchsorted(quotes, starts) != np.searchsorted(quotes, key_ends)
+        return key_starts, key_ends, quoted | last_field
+
+    def _key(self, start: int, end: int, key_start: int, key_end: int, parse: bool) -> str:
+        if parse:
+            row = next(csv.reader([self.buffer[start:end].decode('utf-8').rstrip('\r\n')]), [])
+            return row[self.key_index] if self.key_index < len(row) else ''
+        return self.buffer[key_start:key_end].decode('utf-8')
+
+    def _block_runs(self, data: np.ndarray, position: int, stop: int, starts: np.ndarray, ends: np.ndarray,
+                    codes: Dict[str, int]) -> tuple:
+        '''Runs of rows with the same key in a block: their first byte, end and key code'''
+        key_starts, key_ends, parse = self._keys(data, position, stop, starts, ends)
+
+        # A row starts a new run unless its key has the same length and bytes as the key of the previous row:
+        # the first KEY_WIDTH bytes of the keys are compared for all the rows at once
+        lengths = key_ends - key_starts
+        width = np.arange(KEY_WIDTH)
+        prefixes = np.where(width < lengths[:, None], data[np.minimum(key_starts[:, None] + width, self.size - 1)], 0)
+        changed = np.ones(len(starts), dtype=bool)
+        changed[1:] = (lengths[1:] != lengths[:-1]) | (prefixes[1:] != prefixes[:-1]).any(axis=1)
+        changed |= parse
+        changed[1:] |= parse[:-1]
+        for row in np.flatnonzero(~changed & (lengths > KEY_WIDTH)).tolist():
+            changed[row] = (self.buffer[key_starts[row]:key_ends[row]] !=
+                            self.buffer[key_starts[row - 1]:key_ends[row - 1]])
+
+        # Keys are decoded once per run and numbered in the order they are found
+        firsts = np.flatnonzero(changed)
+        lasts = np.append(firsts[1:], len(starts)) - 1
+        run_codes = np.array([codes.setdefault(self._key(starts[row], ends[row], key_starts[row], key_ends[row],
+                                                         parse[row]), len(codes))
+                              for row in firsts.tolist()], dtype=np.int64)
+        return starts[firsts], ends[lasts], run_codes
+
+    def runs(self) -> Dict[str, np.ndarray]:
+        '''
+        Byte ranges of the rows of every key: key -> array of (start, end) ranges, in the file order.
+        Rows with an empty key and blank lines are skipped, as pandas does
+        '''
+        if self.key_index is None:
+            raise ValueError('The DataFrame does not contains the required columns')
+
+        codes: Dict[str, int] = {}
+        blocks: List[tuple] = []
+        # Zero-copy view of the mapped file, it must not outlive the scan (a map with views cannot be closed)
+        data = np.frombuffer(self.buffer, dtype=np.uint8)
+        try:
+            position, block_size = self.data_start, self.block_size
+            while position < self.size:
+                stop = min(position + block_size, self.size)
+                row_ends = self._row_ends(data, position, stop)
+                if stop == self.size and (not len(row_ends) or row_ends[-1] < self.size):
+                    # Last row without a final newline
+                    row_ends = np.append(row_ends, self.size)
+                if not len(row_ends):
+                    # A row longer than the block
+                    block_size *= 2
+                    continue
+                starts = np.concatenate(([position], row_ends[:-1]))
+
+                # Blank lines ('\n' or '\r\n') are not rows
+                lengths = row_ends - starts
+                rows = ~((lengths == 1) | ((lengths == 2) & (data[starts] == CARRIAGE_RETURN)))
+                if rows.any():
+                    blocks.append(self._block_runs(data, position, stop, starts[rows], row_ends[rows], codes))
+
+                self._release(position, int(row_ends[-1]))
+                position, block_size = int(row_ends[-1]), self.block_size
+        finally:
+            del data
+        if not blocks:
+            return {}
+
+        # Runs of the same key which follow each other (across blocks) are merged
+        starts, ends, run_codes = (np.concatenate(values) for values in zip(*blocks))
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = (run_codes[1:] != run_codes[:-1]) | (starts[1:] != ends[:-1])
+        firsts = np.flatnonzero(first)
+        starts, ends, run_codes = starts[firsts], ends[np.append(firsts[1:], len(first)) - 1], run_codes[firsts]
+
+        order = np.argsort(run_codes, kind='stable')
+        bounds = np.searchsorted(run_codes[order], np.arange(len(codes) + 1))
+        return {key: np.stack((starts[order[bounds[code]:bounds[code + 1]]],
+                               ends[order[bounds[code]:bounds[code + 1]]]), axis=1)
+                for key, code in codes.items() if key != ''}
+
+    def read(self, ranges: np.ndarray) -> io.BytesIO:
+        '''The header and the rows of the byte ranges as a file for pandas, their pages are released'''
+        ranges = ranges.tolist()
+        content = io.BytesIO(self.header + b''.join(self.buffer[start:end] for start, end in ranges))
+        for start, end in ranges:
+            self._release(start, end)
+        return content
@@ -3,4 +3,7 @@ from .base import Base
 from .foodItem import FoodItem
 from .restaurant import Restaurant
 from .subcategory import SubCategory
-from .fooditem_subcategory import FoodItemSubcategory
\ No newline at end of file
+from .fooditem_subcategory import FoodItemSubcategory
+from .load_manifest import LoadManifest
+from .restaurant_nutrition_stats import RestaurantNutritionStats
+from .load_checkpoint import LoadCheckpoint
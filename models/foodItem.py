@@ -1,13 +1,16 @@
 from .base import Base
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, UniqueConstraint
 
 
 # FoodItem model
 class FoodItem(Base):
     __tablename__ = 'food_items'
+    # An item name is unique within a restaurant (used for deduplication on load),
+    # the constraint also indexes the lookups by restaurant_id
+    __table_args__ = (UniqueConstraint('restaurant_id', 'name', name='uq_food_items_restaurant_id_name'),)
 
     id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
     calories = Column(Integer)
     cal_fat = Column(Float)
     total_fat = Column(Float)
@@ -23,5 +26,7 @@ class FoodItem(Base):
     vit_c = Column(Float)
     calcium = Column(Float)
     salad = Column(String)
+    # Hash of the CSV row (restaurant, item and nutrition values) set by incremental loads
+    content_hash = Column(String(32))
     restaurant_id = Column(Integer, ForeignKey('restaurants.id'))
-    category_id = Column(Integer, ForeignKey('categories.id'))
\ No newline at end of file
+    category_id = Column(Integer, ForeignKey('categories.id'), index=True)
\ No newline at end of file
@@ -1,11 +1,14 @@
 from .base import Base
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, UniqueConstraint
 
 class FoodItemSubcategory(Base):
     __tablename__ = 'food_item_subcategory'
+    # A subcategory is linked once to an item, the constraint also indexes the lookups by food_item_id
+    __table_args__ = (UniqueConstraint('food_item_id', 'subcategory_id',
+                                       name='uq_food_item_subcategory_food_item_id_subcategory_id'),)
 
     id = Column(Integer, primary_key=True)
     food_item_id = Column(Integer, ForeignKey('food_items.id'))
-    subcategory_id = Column(Integer, ForeignKey('sub_categories.id'))
+    subcategory_id = Column(Integer, ForeignKey('sub_categories.id'), index=True)
 
     
\ No newline at end of file
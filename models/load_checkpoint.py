@@ -0,0 +1,20 @@
+from .base import Base
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint, func
+
+
+# Progress of a file being loaded, identified by the hash of its content: the last committed restaurant
+# of the chunk starting at row_offset (see checkpoints.py), removed once the file is fully loaded
+class LoadCheckpoint(Base):
+    __tablename__ = 'load_checkpoints'
+    __table_args__ = (UniqueConstraint('file_hash', name='uq_load_checkpoints_file_hash'),)
+
+    id = Column(Integer, primary_key=True)
+    file_hash = Column(String(64), nullable=False)
+    file_name = Column(String)
+    # Rows per chunk of the load (NULL when the file is read as a single chunk)
+    chunksize = Column(Integer)
+    row_offset = Column(Integer, nullable=False)
+    restaurant = Column(String, nullable=False)
+    # Rows of the file committed so far
+    rows = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
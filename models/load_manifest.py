@@ -0,0 +1,14 @@
+from .base import Base
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint, func
+
+
+# Files loaded in incremental mode, identified by the hash of their content
+class LoadManifest(Base):
+    __tablename__ = 'load_manifest'
+    __table_args__ = (UniqueConstraint('file_hash', name='uq_load_manifest_file_hash'),)
+
+    id = Column(Integer, primary_key=True)
+    file_hash = Column(String(64), nullable=False)
+    file_name = Column(String)
+    rows = Column(Integer)
+    loaded_at = Column(DateTime, server_default=func.now())
@@ -1,9 +1,10 @@
 from .base import Base
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, UniqueConstraint
 
 
 class Restaurant(Base):
     __tablename__ = 'restaurants'
+    __table_args__ = (UniqueConstraint('name', name='uq_restaurants_name'),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String)
\ No newline at end of file
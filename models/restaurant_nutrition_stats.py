@@ -0,0 +1,15 @@
+from .base import Base
+from sqlalchemy import Column, Float, ForeignKey, Integer
+
+
+# Nutrition statistics per restaurant, recomputed by the loader for every restaurant it writes
+# (see nutrition_stats.py) so that the visualizer does not scan food_items
+class RestaurantNutritionStats(Base):
+    __tablename__ = 'restaurant_nutrition_stats'
+
+    restaurant_id = Column(Integer, ForeignKey('restaurants.id'), primary_key=True)
+    items = Column(Integer, nullable=False)
+    avg_calories = Column(Float)
+    min_calories = Column(Integer)
+    max_calories = Column(Integer)
+    avg_carbs = Column(Float)
@@ -0,0 +1,33 @@
+from typing import Iterable
+from sqlalchemy import delete, func, insert, select
+from models import FoodItem, RestaurantNutritionStats
+
+stats_columns = ['restaurant_id', 'items', 'avg_calories', 'min_calories', 'max_calories', 'avg_carbs']
+
+
+def live_nutrition_stats(restaurant_ids: Iterable[int] | None = None):
+    '''Nutrition statistics per restaurant aggregated from food_items (a scan of the items)'''
+    query = select(
+        FoodItem.restaurant_id,
+        func.count(FoodItem.id),
+        func.avg(FoodItem.calories),
+        func.min(FoodItem.calories),
+        func.max(FoodItem.calories),
+        func.avg(FoodItem.total_carb)
+    ).group_by(FoodItem.restaurant_id)
+    if restaurant_ids is not None:
+        query = query.where(FoodItem.restaurant_id.in_(restaurant_ids))
+    return query
+
+
+def refresh_nutrition_stats(session, restaurant_ids: Iterable[int] | None = None) -> None:
+    '''
+    Recompute the statistics of the given restaurants (all of them by default) in the current transaction,
+    so they are committed together with the items
+    '''
+    statement = delete(RestaurantNutritionStats)
+    if restaurant_ids is not None:
+        restaurant_ids = list(restaurant_ids)
+        statement = statement.where(RestaurantNutritionStats.restaurant_id.in_(restaurant_ids))
+    session.execute(statement.execution_options(synchronize_session=False))
+    session.execute(insert(RestaurantNutritionStats).from_select(stats_columns, live_nutrition_stats(restaurant_ids)))
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+# Categories checked in this order: the first matching rule wins, anything else is 'Other'
+CATEGORY_PRECEDENCE: List[str] = ['Side', 'Main', 'Dessert']
+
+# Compiled rulesets are cached in this directory (RULES_CACHE_DIR), keyed by the hash of the rules
+RULES_CACHE_DIR = os.environ.get('RULES_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'food_rules'))
+
+# Bump when the layout of the compiled automaton changes, so that old cache files are not read
+AUTOMATON_VERSION = 2
+
+
+def load_rules(file_name: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, List[str]]]:
+    '''
+    Read category and subcategory rules from a JSON or YAML (requires PyYAML) file:
+    {"categories": {"Main": {"keywords": [...], "calories": 199}, ...}, "subcategories": {"Beef": [...], ...}}
+    '''
+    try:
+        with open(file_name) as file:
+            if file_name.endswith(('.yaml', '.yml')):
+                import yaml
+                rules = yaml.safe_load(file)
+            else:
+                rules = json.load(file)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'Rules file not found: {file_name}')
+
+    if not isinstance(rules, dict) or not {'categories', 'subcategories'} <= set(rules):
+        raise ValueError('The rules file must define "categories" and "subcategories"')
+    missing = [name for name in CATEGORY_PRECEDENCE if name not in rules['categories']]
+    if missing:
+        raise ValueError(f'The rules file does not define the categories: {", ".join(missing)}')
+    return rules['categories'], rules['subcategories']
+
+
+def rules_hash(category_rules: Dict[str, Dict[str, Any]], subcategory_rules: Dict[str, List[str]]) -> str:
+    '''SHA-256 of the rules, independent of the key order'''
+    content = json.dumps([AUTOMATON_VERSION, category_rules, subcategory_rules], sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class KeywordAutomaton:
+    '''
+    Aho-Corasick automaton over the keywords of several rules: one pass over a text finds the rules
+    having a keyword in it, whatever the number of keywords.
+    Built as a DFA: every state maps each character to the next state (missing characters lead back
+    to the root) and holds the bit mask of the rules whose keywords end there
+    '''
+
+    def __init__(self, rules: Dict[str, List[str]]) -> None:
+        self.rule_names: List[str] = list(rules)
+        goto: List[Dict[str, int]] = [{}]
+        self.outputs: List[int] = [0]
+
+        # Trie of the (lower-cased) keywords
+        for bit, keywords in enumerate(rules.values()):
+            for keyword in keywords:
+                state = 0
+                for char in keyword.lower():
+                    if char not in goto[state]:
+                        goto.append({})
+                        self.outputs.append(0)
+                        goto[state][char] = len(goto) - 1
+                    state = goto[state][char]
+                self.outputs[state] |= 1 << bit
+
+        # Breadth-first: the failure link of a state is the longest proper suffix which is also in the trie,
+        # its transitions complete the missing ones and its outputs are inherited
+        self.transitions: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        failure = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            fallback = self.transitions[failure[state]]
+            self.outputs[state] |= self.outputs[failure[state]]
+            transitions = self.transitions[state]
+            transitions.update((char, next_state) for char, next_state in fallback.items() if next_state)
+            for char, next_state in goto[state].items():
+                failure[next_state] = fallback.get(char, 0)
+                transitions[char] = next_state
+                queue.append(next_state)
+
+    def match(self, text: str) -> int:
+        '''Bit mask of the rules with a keyword in the (lower-cased) text'''
+        transitions, outputs = self.transitions, self.outputs
+        state, found = 0, 0
+        for char in text:
+            state = transitions[state].get(char, 0)
+            found |= outputs[state]
+        return found
+
+    def bit(self, rule_name: str) -> int:
+        return 1 << self.rule_names.index(rule_name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'rule_names': self.rule_names, 'transitions': self.transitions, 'outputs': self.outputs}
+
+    @classmethod
+    def from_dict(cls, content: Dict[str, Any]) -> 'KeywordAutomaton':
+        '''Automaton saved with to_dict, without compiling the keywords again'''
+        automaton = cls.__new__(cls)
+        automaton.rule_names = content['rule_names']
+        automaton.transitions = content['transitions']
+        automaton.outputs = content['outputs']
+        return automaton
+
+
+def compile_rules(category_rules: Dict[str, Dict[str, Any]], subcategory_rules: Dict[str, List[str]],
+                  cache_dir: str | None = RULES_CACHE_DIR) -> KeywordAutomaton:
+    '''
+    Compile the keywords of all category and subcategory rules into one automaton
+    (rule names 'category:<name>' and 'subcategory:<name>'), loaded from the cache when the same rules
+    were already compiled. cache_dir=None disables the cache
+    '''
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, f'{rules_hash(category_rules, subcategory_rules)}.json')
+        try:
+            with open(cache_file) as file:
+                return KeywordAutomaton.from_dict(json.load(file))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    automaton = KeywordAutomaton({
+        **{f'category:{name}': rule['keywords'] for name, rule in category_rules.items()},
+        **{f'subcategory:{name}': keywords for name, keywords in subcategory_rules.items()},
+    })
+
+    if cache_file is not None:
+        # Write to a temporary file first, concurrent runs never read a partial file
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temporary_file = f'{cache_file}.{os.getpid()}'
+            with open(temporary_file, 'w') as file:
+                json.dump(automaton.to_dict(), file)
+            os.replace(temporary_file, cache_file)
+        except OSError:
+            pass
+    return automaton
@@ -1,17 +1,157 @@
-from sqlalchemy import create_engine
+import os
+from configparser import ConfigParser
+from typing import Any, Callable, Dict
+from sqlalchemy import URL, Engine, create_engine, event, make_url
 from sqlalchemy.orm import sessionmaker
 
-# Configurations for the DB connection
-engine = create_engine('*DATABASE_URL*')
-Session = sessionmaker(bind=engine)
+# Configurations for the DB connection.
+# The URL comes from configure() (command line), the DATABASE_URL environment variable or alembic.ini (sqlalchemy.url),
+# engine options from configure() or DB_<OPTION> environment variables (e.g. DB_POOL_SIZE=10)
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alembic.ini')
 
 
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Supported engine options and how their text values are converted
+engine_options: Dict[str, Callable[[str], Any]] = {
+    'pool_size': int,
+    'max_overflow': int,
+    'pool_timeout': float,
+    'pool_recycle': int,
+    'pool_pre_ping': _flag,
+    'echo': _flag,
+    # Statement cache of compiled SQL
+    'query_cache_size': int,
+    # Rows per INSERT statement of the batched "insertmanyvalues" executemany
+    'insertmanyvalues_page_size': int,
+    # psycopg2 only: 'values_only' or 'values_plus_batch'
+    'executemany_mode': str,
+    # pyodbc only
+    'fast_executemany': _flag,
+}
+
+# Seconds a SQLite connection of the workers waits for the write lock held by another one
+SQLITE_BUSY_TIMEOUT = 60.0
+
+# Drivers of the asyncio engine by dialect (see create_async_engine_from_config)
+async_drivers: Dict[str, str] = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+_settings: Dict[str, Any] = {}
+_engine: Engine | None = None
+
+# Sessions are bound to the engine when they are created (see DBSession)
+Session = sessionmaker()
+
+
+def parse_engine_option(option: str) -> Dict[str, Any]:
+    '''Parse a KEY=VALUE engine option (as given on the command line)'''
+    name, separator, value = option.partition('=')
+    name = name.strip().replace('-', '_')
+    if not separator or name not in engine_options:
+        raise ValueError(f'Unknown engine option: {option}, expected KEY=VALUE with KEY in {", ".join(engine_options)}')
+    return {name: engine_options[name](value)}
+
+
+def configure(url: str | None = None, **options) -> None:
+    '''Override the DB URL and engine options, the engine is recreated on next use'''
+    global _engine
+    unknown = set(options) - set(engine_options)
+    if unknown:
+        raise ValueError(f'Unknown engine options: {", ".join(sorted(unknown))}')
+
+    if url is not None:
+        _settings['url'] = url
+    _settings.update(options)
+
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+def get_database_url() -> str:
+    url = _settings.get('url') or os.environ.get('DATABASE_URL')
+    if not url and os.path.exists(ALEMBIC_INI):
+        config = ConfigParser(defaults={'here': os.path.dirname(ALEMBIC_INI)})
+        config.read(ALEMBIC_INI)
+        url = config.get('alembic', 'sqlalchemy.url', fallback=None)
+
+    # alembic.ini ships with a DATABASE_URL placeholder
+    if not url or url == 'DATABASE_URL':
+        raise ValueError('The DB URL is not configured: set DATABASE_URL or sqlalchemy.url in alembic.ini')
+    return url
+
+
+def get_engine_options() -> Dict[str, Any]:
+    options = {name: convert(os.environ[f'DB_{name.upper()}'])
+               for name, convert in engine_options.items() if f'DB_{name.upper()}' in os.environ}
+    options.update((name, value) for name, value in _settings.items() if name != 'url')
+    return options
+
+
+def create_engine_from_config(**overrides) -> Engine:
+    '''Create a new engine from the configuration, overrides take precedence over the configured options'''
+    return create_engine(get_database_url(), **{**get_engine_options(), **overrides})
+
+
+def get_engine() -> Engine:
+    '''Shared engine, created on first use'''
+    global _engine
+    if _engine is None:
+        _engine = create_engine_from_config()
+    return _engine
+
+
+def get_async_database_url() -> URL:
+    '''The configured DB URL with the asyncio driver of its dialect (see async_drivers)'''
+    url = make_url(get_database_url())
+    backend = url.get_backend_name()
+    if backend not in async_drivers:
+        raise ValueError(f'No asyncio driver for {backend}, supported: {", ".join(async_drivers)}')
+    return url.set(drivername=f'{backend}+{async_drivers[backend]}')
+
+
+def create_async_engine_from_config(**overrides):
+    '''AsyncEngine to the configured DB, with the same options as create_engine_from_config'''
+    from sqlalchemy.ext.asyncio import create_async_engine
+    return create_async_engine(get_async_database_url(), **{**get_engine_options(), **overrides})
+
+
+def _begin_in_driver(dbapi_connection, connection_record) -> None:
+    # pysqlite must not emit its own (deferred) BEGIN, see _begin_immediate
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(connection) -> None:
+    connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def create_pooled_engine(pool_size: int) -> Engine:
+    '''
+    Engine to the same DB holding up to pool_size connections (one per worker).
+    SQLite has a single writer: the transactions of the workers take the write lock when they begin
+    (BEGIN IMMEDIATE) and wait for it up to SQLITE_BUSY_TIMEOUT seconds, so their writes are serialized
+    instead of failing with "database is locked"
+    '''
+    if make_url(get_database_url()).get_backend_name() != 'sqlite':
+        return create_engine_from_config(pool_size=pool_size, max_overflow=0)
+
+    engine = create_engine_from_config(pool_size=pool_size, max_overflow=0,
+                                       connect_args={'timeout': SQLITE_BUSY_TIMEOUT})
+    event.listen(engine, 'connect', _begin_in_driver)
+    event.listen(engine, 'begin', _begin_immediate)
+    return engine
+
 
 class DBSession:
 
+    def __init__(self, session_factory: sessionmaker | None = None):
+        self.session_factory = session_factory
+
     def __enter__(self):
-        self.session = Session()
+        self.session = self.session_factory() if self.session_factory else Session(bind=get_engine())
         return self.session
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.session.close()
\ No newline at end of file
+        self.session.close()
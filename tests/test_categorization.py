@@ -0,0 +1,80 @@
+'''
+Parity of the vectorized FoodCategorizer with the per-row rules the loader applied item by item
+before the categorization engine (kept here as the reference implementation)
+'''
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DataParser, category_rules, food_categorizer, subcategory_rules
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def categorize_row(row: Dict[str, Any]) -> str:
+    if any(kword in row['item'].lower() for kword in category_rules['Side']['keywords']) and (row['calories'] < category_rules['Side']['calories'] or row['protein'] <= category_rules['Side']['protein'] or row['sugar'] <= category_rules['Side']['sugar']):
+        return 'Side'
+    elif any(kword in row['item'].lower() for kword in category_rules['Main']['keywords']) or row['calories'] > category_rules['Main']['calories']:
+        return 'Main'
+    elif any(kword in row['item'].lower() for kword in category_rules['Dessert']['keywords']) or row['sugar'] > category_rules['Dessert']['sugar']:
+        return 'Dessert'
+    else:
+        return 'Other'
+
+
+def subcategorize_row(row: Dict[str, Any]) -> List[str]:
+    subCategories: List[str] = []
+
+    if any(kword in row['item'].lower() for kword in subcategory_rules['Beef']):
+        subCategories.append('Beef')
+    if any(kword in row['item'].lower() for kword in subcategory_rules['Chicken']):
+        subCategories.append('Chicken')
+    if any(kword in row['item'].lower() for kword in subcategory_rules['Seafood']):
+        subCategories.append('Seafood')
+    if any(kword in row['item'].lower() for kword in subcategory_rules['Pork']):
+        subCategories.append('Pork')
+
+    if not subCategories:
+        subCategories.append('Other')
+    return subCategories
+
+
+def per_row(data: pd.DataFrame):
+    '''Categories and subcategories (Main items only) of every row with the reference rules'''
+    categories, subcategories = [], []
+    for item_row in data.to_dict('records'):
+        category = categorize_row(item_row)
+        categories.append(category)
+        subcategories.append(subcategorize_row(item_row) if category == 'Main' else [])
+    return categories, subcategories
+
+
+def vectorized(data: pd.DataFrame):
+    categories, matrix = food_categorizer.categorize(data)
+    columns = np.array(matrix.columns)
+    return categories.tolist(), [columns[mask].tolist() for mask in matrix.to_numpy()]
+
+
+def test_fastfood_parity():
+    # Rows with missing nutrition values cannot be compared by the per-row rules
+    data = DataParser(os.path.join(ROOT, 'fastfood.csv')).read_csv()
+    data = data.dropna(subset=['calories', 'protein', 'sugar'])
+    assert len(data) > 400
+    assert vectorized(data) == per_row(data)
+
+
+def test_thresholds_and_keywords_parity():
+    # Values around every threshold of the rules and names with zero, one or several keywords
+    rng = np.random.default_rng(0)
+    names = ['Burger', 'Side Salad', 'Apple Pie', 'Ice Cream Cone', 'Fish Sandwich', 'Ham and Beef Sub',
+             'CHICKEN Nuggets 6 Piece', 'Coffee', 'Bacon Wrap', 'Seafood Platter', 'French Fries Cake']
+    rows = 5000
+    data = pd.DataFrame({
+        'item': np.array(names)[rng.integers(0, len(names), rows)],
+        'calories': rng.choice([0, 198, 199, 200, 1500], rows),
+        'protein': rng.choice([0, 9, 10, 11, 60], rows),
+        'sugar': rng.choice([0, 14, 15, 16, 80], rows),
+    })
+    assert vectorized(data) == per_row(data)
@@ -0,0 +1,27 @@
+'''
+Values of the parsed CSV as they are written to DB
+'''
+import numpy as np
+
+from csv_schema import db_values
+from data_loader import DataParser
+
+CSV = '''restaurant,item,calories,cal_fat,total_fat,sat_fat,trans_fat,cholesterol,sodium,total_carb,fiber,sugar,protein,vit_a,vit_c,calcium,salad
+Mcdonalds,Big Mac,540,240,27,10,1,80,950,46,3,9,25,6,2,25,Other
+Mcdonalds,Mega Meal,40000,1.1,0.1,,,,,,,,,,,,Other
+Mcdonalds,Half Fries,250.5,100,,,,,,,,,,,,,Other
+Mcdonalds,Water,,,,,,,,,,,,,,,Other
+'''
+
+
+def test_db_values_keep_the_file_values(tmp_path):
+    path = tmp_path / 'menu.csv'
+    path.write_text(CSV)
+    data = DataParser(str(path)).read_csv()
+    rows = db_values(data, ['calories', 'cal_fat', 'total_fat', 'sat_fat'])
+
+    assert [row['calories'] for row in rows] == [540, 40000, 250.5, None]
+    assert [type(row['calories']) for row in rows] == [int, int, float, type(None)]
+    assert rows[1]['cal_fat'] == 1.1 and rows[1]['total_fat'] == 0.1
+    assert rows[1]['sat_fat'] is None and rows[3]['cal_fat'] is None
+    assert not any(isinstance(value, np.generic) for row in rows for value in row.values())
@@ -0,0 +1,40 @@
+'''
+Reading and indexing the CSV by restaurant, in chunks or at once
+'''
+import os
+
+import pandas as pd
+import pytest
+
+from data_loader import DataParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def csv_without_restaurants(tmp_path):
+    # The first 5 rows have no restaurant
+    data = pd.read_csv(os.path.join(ROOT, 'fastfood.csv')).head(20)
+    data.loc[:4, 'restaurant'] = None
+    path = tmp_path / 'menu.csv'
+    data.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('chunksize', [3, 5])
+def test_chunks_without_restaurants(csv_without_restaurants, chunksize):
+    chunks = list(DataParser(csv_without_restaurants).iter_chunks(chunksize))
+    assert [chunk.row_offset for chunk in chunks] == list(range(0, 20, chunksize))
+    assert chunks[0].get_restaurants_names() == []
+    assert len(chunks[0].data) == 0
+    assert sum(len(chunk.data) for chunk in chunks) == 15
+    assert {name for chunk in chunks for name in chunk.get_restaurants_names()} == {'Mcdonalds'}
+
+
+def test_file_without_restaurants(tmp_path):
+    data = pd.read_csv(os.path.join(ROOT, 'fastfood.csv')).head(3).assign(restaurant=None)
+    path = tmp_path / 'menu.csv'
+    data.to_csv(path, index=False)
+    parser = DataParser(str(path))
+    assert parser.get_restaurants_names() == []
+    assert parser.data.empty
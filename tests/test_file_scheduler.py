@@ -0,0 +1,87 @@
+'''
+Loads of several files sharing the loader caches (file_scheduler.load_files)
+'''
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+import data_loader
+import session
+from file_scheduler import load_files
+from models import Base, FoodItem
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(session, '_settings', {})
+    monkeypatch.setattr(session, '_engine', None)
+    session.configure(f'sqlite:///{tmp_path}/files.db')
+    Base.metadata.create_all(session.get_engine())
+    yield
+    session.get_engine().dispose()
+
+
+@pytest.fixture
+def menu_files(tmp_path):
+    # fastfood.csv split into files of different sizes, compressed or not: every restaurant is in two files
+    data = pd.read_csv(os.path.join(ROOT, 'fastfood.csv'))
+    first_restaurants = data['restaurant'].isin(data['restaurant'].unique()[:4])
+    third_rows = data.index % 3 == 0
+    paths = []
+    for position, (rows, extension) in enumerate([(~third_rows, '.csv'), (third_rows & first_restaurants, '.csv.bz2'),
+                                                  (third_rows & ~first_restaurants, '.csv.gz')]):
+        path = str(tmp_path / f'menu_{position}{extension}')
+        data[rows].to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def count_items() -> int:
+    with session.DBSession() as db_session:
+        return db_session.scalar(select(func.count(FoodItem.id)))
+
+
+@pytest.mark.parametrize('mode', ['bulk', 'copy'])
+def test_load_several_files(db, menu_files, mode):
+    report = load_files(menu_files, file_workers=2, mode=mode)
+    assert report['statuses'] == {'loaded': 3}, report['files']
+    assert report['inserted'] == count_items() == 513
+
+    # Loaded files are skipped on the next run
+    report = load_files(menu_files, file_workers=2, mode=mode)
+    assert report['statuses'] == {'already_loaded': 3}
+    assert count_items() == 513
+
+
+@pytest.mark.parametrize('options', [{}, {'workers': 2}, {'incremental': True}], ids=['serial', 'workers', 'incremental'])
+def test_rolled_back_items_are_loaded_by_other_files(db, monkeypatch, tmp_path, options):
+    # The second file is a subset of the first one, whose first write fails
+    data = pd.read_csv(os.path.join(ROOT, 'fastfood.csv'))
+    first, second = str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv')
+    data.to_csv(first, index=False)
+    data[data['restaurant'] == data['restaurant'].iloc[0]].to_csv(second, index=False)
+
+    write = data_loader._write_restaurant_items
+    failures = [data['restaurant'].iloc[0]]
+
+    def failing_write(session, writer, restaurant_menu, *args):
+        result = write(session, writer, restaurant_menu, *args)
+        if restaurant_menu.name in failures:
+            failures.remove(restaurant_menu.name)
+            raise RuntimeError('Transient write failure')
+        return result
+
+    monkeypatch.setattr(data_loader, '_write_restaurant_items', failing_write)
+    report = load_files([first, second], **options)
+    assert report['files'][first]['status'] == 'failed'
+    assert report['files'][second]['status'] == 'loaded'
+    assert report['files'][second]['stats']['inserted'] > 0
+
+    # The failed file is loaded again on the next run, the items of the second one are not written twice
+    report = load_files([first, second], **options)
+    assert report['statuses'] == {'loaded': 1, 'already_loaded': 1}
+    assert count_items() == 513
@@ -0,0 +1,58 @@
+'''
+Incremental loads after loads in the other modes: only the items whose values changed are updated
+'''
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select, update
+
+import session
+from data_loader import load_restaurants_data_from_csv_to_db
+from models import Base, FoodItem
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FASTFOOD_CSV = os.path.join(ROOT, 'fastfood.csv')
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(session, '_settings', {})
+    monkeypatch.setattr(session, '_engine', None)
+    session.configure(f'sqlite:///{tmp_path}/incremental.db')
+    Base.metadata.create_all(session.get_engine())
+    yield
+    session.get_engine().dispose()
+
+
+@pytest.fixture
+def modified_csv(tmp_path):
+    data = pd.read_csv(FASTFOOD_CSV)
+    data.loc[:9, 'sodium'] += 10
+    path = tmp_path / 'modified.csv'
+    data.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('mode', ['bulk', 'row', 'copy'])
+def test_incremental_after_load(db, modified_csv, mode):
+    load_restaurants_data_from_csv_to_db(FASTFOOD_CSV, mode=mode)
+
+    stats = load_restaurants_data_from_csv_to_db(FASTFOOD_CSV, incremental=True)
+    assert (stats['inserted'], stats['updated']) == (0, 0)
+
+    stats = load_restaurants_data_from_csv_to_db(modified_csv, incremental=True)
+    assert (stats['inserted'], stats['updated']) == (0, 10)
+
+
+def test_incremental_after_items_without_hash(db, modified_csv):
+    # Items written before the loader stored content hashes
+    load_restaurants_data_from_csv_to_db(FASTFOOD_CSV)
+    with session.DBSession() as db_session:
+        db_session.execute(update(FoodItem).values(content_hash=None))
+        db_session.commit()
+
+    stats = load_restaurants_data_from_csv_to_db(modified_csv, incremental=True)
+    assert (stats['inserted'], stats['updated']) == (0, 10)
+    with session.DBSession() as db_session:
+        assert db_session.scalar(select(func.count()).where(FoodItem.content_hash.is_not(None))) == 10
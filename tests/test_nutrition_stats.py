@@ -0,0 +1,67 @@
+'''
+The restaurant_nutrition_stats table kept up to date by the loader matches the statistics
+aggregated from food_items (live_nutrition_stats) in every load mode
+'''
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+import session
+from data_loader import load_restaurants_data_from_csv_to_db
+from models import Base, RestaurantNutritionStats
+from nutrition_stats import live_nutrition_stats, stats_columns
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FASTFOOD_CSV = os.path.join(ROOT, 'fastfood.csv')
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr(session, '_settings', {})
+    monkeypatch.setattr(session, '_engine', None)
+    session.configure(f'sqlite:///{tmp_path}/stats.db')
+    Base.metadata.create_all(session.get_engine())
+    yield
+    session.get_engine().dispose()
+
+
+def assert_stats_match_items() -> None:
+    with session.DBSession() as db_session:
+        stored = db_session.execute(
+            select(*(getattr(RestaurantNutritionStats, column) for column in stats_columns))).all()
+        live = db_session.execute(live_nutrition_stats()).all()
+    stored = pd.DataFrame(stored, columns=stats_columns).sort_values('restaurant_id', ignore_index=True)
+    live = pd.DataFrame(live, columns=stats_columns).sort_values('restaurant_id', ignore_index=True)
+    assert len(stored) == 8
+    pd.testing.assert_frame_equal(stored, live, check_dtype=False)
+
+
+@pytest.mark.parametrize('options', [
+    {'mode': 'bulk'},
+    {'mode': 'copy'},
+    {'mode': 'bulk', 'workers': 3, 'batch_size': 7},
+    {'mode': 'row', 'chunksize': 100},
+], ids=['bulk', 'copy', 'workers', 'row-chunks'])
+def test_stats_after_load(db, options):
+    stats = load_restaurants_data_from_csv_to_db(FASTFOOD_CSV, **options)
+    assert not stats['failed']
+    assert_stats_match_items()
+
+
+def test_stats_after_incremental_update(db, tmp_path):
+    load_restaurants_data_from_csv_to_db(FASTFOOD_CSV, incremental=True)
+    assert_stats_match_items()
+
+    # Changed nutrition values of existing items and a new item
+    data = pd.read_csv(FASTFOOD_CSV)
+    data.loc[:20, 'calories'] += 100
+    data.loc[:20, 'total_carb'] = 0
+    new_item = data.iloc[[0]].assign(item='Brand New Burger', calories=1500)
+    modified_csv = tmp_path / 'modified.csv'
+    pd.concat([data, new_item]).to_csv(modified_csv, index=False)
+
+    stats = load_restaurants_data_from_csv_to_db(str(modified_csv), incremental=True)
+    assert stats['updated'] == 21 and stats['inserted'] == 1
+    assert_stats_match_items()
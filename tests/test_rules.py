@@ -0,0 +1,50 @@
+'''
+Rules file, keyword automaton and cache of compiled rules
+'''
+import os
+
+import numpy as np
+
+from categorization import FoodCategorizer
+from data_loader import category_rules, subcategory_rules
+from rules import KeywordAutomaton, compile_rules, load_rules, rules_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_rules_file_matches_built_in_rules():
+    assert load_rules(os.path.join(ROOT, 'rules.yaml')) == (category_rules, subcategory_rules)
+
+
+def test_automaton_matches_substring_checks():
+    # Overlapping keywords and keywords inside other keywords
+    rules = {'a': ['he', 'she', 'hers'], 'b': ['his', 'e'], 'c': ['ice cream', 'cream'], 'd': ['sub', 'subway']}
+    automaton = KeywordAutomaton(rules)
+    rng = np.random.default_rng(0)
+    words = ['she', 'hers', 'his', 'ice', 'cream', 'subway', 'sub', 'xyz', 'h', 'ers']
+    for _ in range(10000):
+        text = ' '.join(rng.choice(words, rng.integers(0, 4)))
+        expected = sum(1 << bit for bit, keywords in enumerate(rules.values()) if any(k in text for k in keywords))
+        assert automaton.match(text) == expected, text
+
+
+def test_compiled_rules_are_cached_as_json(tmp_path):
+    automaton = compile_rules(category_rules, subcategory_rules, str(tmp_path))
+    cache_file = tmp_path / f'{rules_hash(category_rules, subcategory_rules)}.json'
+    assert cache_file.exists()
+
+    cached = compile_rules(category_rules, subcategory_rules, str(tmp_path))
+    assert cached.to_dict() == automaton.to_dict()
+    for text in ('big mac', 'chicken sandwich', 'apple pie', 'side salad', 'water'):
+        assert cached.match(text) == automaton.match(text)
+
+    # A damaged cache file is compiled again
+    cache_file.write_text('{')
+    assert compile_rules(category_rules, subcategory_rules, str(tmp_path)).to_dict() == automaton.to_dict()
+
+
+def test_categorizer_compiles_on_first_use(tmp_path):
+    categorizer = FoodCategorizer(category_rules, subcategory_rules, cache_dir=str(tmp_path))
+    assert not any(tmp_path.iterdir())
+    assert categorizer.automaton is categorizer.automaton
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,127 @@
+'''
+Configuration of the DB engine: URL precedence, engine options and the shared engine, against SQLite
+'''
+import pytest
+from sqlalchemy import text
+
+import session
+
+
+@pytest.fixture(autouse=True)
+def isolated_config(monkeypatch, tmp_path):
+    # No configuration from the environment or the alembic.ini of the repository
+    monkeypatch.setattr(session, '_settings', {})
+    monkeypatch.setattr(session, '_engine', None)
+    monkeypatch.setattr(session, 'ALEMBIC_INI', str(tmp_path / 'alembic.ini'))
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    for name in session.engine_options:
+        monkeypatch.delenv(f'DB_{name.upper()}', raising=False)
+    yield
+    if session._engine is not None:
+        session._engine.dispose()
+
+
+def write_alembic_ini(url: str) -> None:
+    with open(session.ALEMBIC_INI, 'w') as file:
+        file.write(f'[alembic]\nscript_location = alembic\nsqlalchemy.url = {url}\n')
+
+
+def test_url_precedence(monkeypatch, tmp_path):
+    write_alembic_ini(f'sqlite:///{tmp_path}/ini.db')
+    assert session.get_database_url() == f'sqlite:///{tmp_path}/ini.db'
+
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path}/env.db')
+    assert session.get_database_url() == f'sqlite:///{tmp_path}/env.db'
+
+    session.configure(f'sqlite:///{tmp_path}/cli.db')
+    assert session.get_database_url() == f'sqlite:///{tmp_path}/cli.db'
+
+
+def test_alembic_ini_here_and_placeholder(tmp_path):
+    write_alembic_ini('sqlite:///%(here)s/ini.db')
+    assert session.get_database_url() == f'sqlite:///{tmp_path}/ini.db'
+
+    # The placeholder shipped in alembic.ini is not a URL
+    write_alembic_ini('DATABASE_URL')
+    with pytest.raises(ValueError, match='not configured'):
+        session.get_database_url()
+
+
+def test_missing_url():
+    with pytest.raises(ValueError, match='not configured'):
+        session.get_database_url()
+
+
+@pytest.mark.parametrize('option, expected', [
+    ('pool_size=10', {'pool_size': 10}),
+    ('pool-timeout=2.5', {'pool_timeout': 2.5}),
+    ('pool_pre_ping=yes', {'pool_pre_ping': True}),
+    ('echo=0', {'echo': False}),
+    ('executemany_mode=values_only', {'executemany_mode': 'values_only'}),
+])
+def test_parse_engine_option(option, expected):
+    assert session.parse_engine_option(option) == expected
+
+
+@pytest.mark.parametrize('option', ['pool_size', 'unknown=1'])
+def test_parse_engine_option_errors(option):
+    with pytest.raises(ValueError, match='Unknown engine option'):
+        session.parse_engine_option(option)
+
+
+def test_parse_engine_option_bad_value():
+    with pytest.raises(ValueError):
+        session.parse_engine_option('pool_size=ten')
+
+
+def test_environment_options(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '7')
+    monkeypatch.setenv('DB_POOL_PRE_PING', 'true')
+    monkeypatch.setenv('DB_QUERY_CACHE_SIZE', '100')
+    assert session.get_engine_options() == {'pool_size': 7, 'pool_pre_ping': True, 'query_cache_size': 100}
+
+    # configure() takes precedence over the environment
+    session.configure(pool_size=3)
+    assert session.get_engine_options()['pool_size'] == 3
+
+
+def test_configure_rejects_unknown_options():
+    with pytest.raises(ValueError, match='Unknown engine options: colour'):
+        session.configure(colour='blue')
+
+
+def test_configure_recreates_the_engine(monkeypatch, tmp_path):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path}/first.db')
+    session.configure(pool_size=2)
+    engine = session.get_engine()
+    assert session.get_engine() is engine
+    assert engine.url.database == f'{tmp_path}/first.db'
+    assert engine.pool.size() == 2
+
+    session.configure(f'sqlite:///{tmp_path}/second.db')
+    second_engine = session.get_engine()
+    assert second_engine is not engine
+    assert second_engine.url.database == f'{tmp_path}/second.db'
+    with session.DBSession() as db_session:
+        assert db_session.execute(text('SELECT 1')).scalar() == 1
+
+
+def test_pooled_sqlite_engine_begins_immediate(tmp_path):
+    session.configure(f'sqlite:///{tmp_path}/pooled.db')
+    engine = session.create_pooled_engine(3)
+    try:
+        assert engine.pool.size() == 3
+        with engine.begin() as connection:
+            # The write lock is taken when the transaction begins
+            assert connection.connection.dbapi_connection.in_transaction
+    finally:
+        engine.dispose()
+
+
+def test_async_url(tmp_path):
+    session.configure(f'sqlite:///{tmp_path}/async.db')
+    assert session.get_async_database_url().drivername == 'sqlite+aiosqlite'
+
+    session.configure('mysql://user@localhost/db')
+    with pytest.raises(ValueError, match='No asyncio driver for mysql'):
+        session.get_async_database_url()